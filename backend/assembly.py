@@ -0,0 +1,69 @@
+import random
+from bisect import bisect_right
+
+# Randomized test assembly from the question index (see migration_assembly.sql).
+# Each index row is one question set: test_id, set_index, set_title, question_count.
+# Sampling only looks at counts; the chosen questions are fetched afterwards.
+
+STRATIFY = ("test", "set")
+
+
+def _allocate(capacities, n, rng):
+    # Spread n picks as evenly as possible over the strata, never more than a
+    # stratum holds; what a small stratum can't take goes to the others
+    quotas = [0] * len(capacities)
+    active = [i for i, cap in enumerate(capacities) if cap > 0]
+    remaining = n
+    while remaining and active:
+        rng.shuffle(active)
+        share, extra = divmod(remaining, len(active))
+        for pos, i in enumerate(active):
+            take = min(capacities[i] - quotas[i], share + (1 if pos < extra else 0))
+            quotas[i] += take
+            remaining -= take
+        active = [i for i in active if quotas[i] < capacities[i]]
+    return quotas
+
+
+def _sample_stratum(groups, k, rng):
+    # groups: index rows of one stratum; pick k distinct questions uniformly
+    offsets = []
+    total = 0
+    for g in groups:
+        offsets.append(total)
+        total += g['question_count']
+    picks = []
+    for pos in rng.sample(range(total), k):
+        i = bisect_right(offsets, pos) - 1
+        picks.append({
+            "test_id": groups[i]['test_id'],
+            "set_index": groups[i]['set_index'],
+            "question_index": pos - offsets[i],
+        })
+    return picks
+
+
+def sample(index_rows, n, seed, stratify=None):
+    """Pick up to n distinct questions. The same rows, n, seed and stratify give the same picks."""
+    rng = random.Random(seed)
+    rows = sorted((r for r in index_rows if r['question_count'] > 0), key=lambda r: (r['test_id'], r['set_index']))
+
+    strata = {}
+    for r in rows:
+        if stratify == "test":
+            key = r['test_id']
+        elif stratify == "set":
+            key = (r['test_id'], r['set_index'])
+        else:
+            key = None
+        strata.setdefault(key, []).append(r)
+
+    groups = list(strata.values())
+    quotas = _allocate([sum(r['question_count'] for r in g) for g in groups], n, rng)
+    picks = []
+    for g, k in zip(groups, quotas):
+        if k:
+            picks.extend(_sample_stratum(g, k, rng))
+    # Mix the strata together
+    rng.shuffle(picks)
+    return picks
@@ -1,11 +1,22 @@
 import os
+import threading
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
-load_dotenv(".env.local", override=True)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _load_env():
+    # On Cloud Run config comes from env vars and no .env files are shipped,
+    # so only import dotenv when there is something to load
+    env_file = os.path.join(BASE_DIR, ".env")
+    env_local_file = os.path.join(BASE_DIR, ".env.local")
+    if not os.path.exists(env_file) and not os.path.exists(env_local_file):
+        return
+    from dotenv import load_dotenv
+    load_dotenv(env_file)
+    load_dotenv(env_local_file, override=True)
+
+_load_env()
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
@@ -13,24 +24,122 @@ key: str = os.environ.get("SUPABASE_KEY")
 if not url or not key:
     raise ValueError("Supabase credentials not found in environment variables")
 
-supabase: Client = create_client(url, key)
+# Cold-start mode: defer importing supabase and building clients until the first request
+LAZY_STARTUP = os.environ.get("LAZY_STARTUP", "").lower() in ("1", "true", "yes")
+# Open the Supabase connection in the lifespan hook instead of on the first request
+PREWARM_CONNECTIONS = os.environ.get("PREWARM_CONNECTIONS", "").lower() in ("1", "true", "yes")
+# Where app data lives: "supabase" (default), or "sqlite" for an embedded database on
+# single-node deployments (see sqlite_backend.py). Sign-in still goes through Supabase Auth.
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "supabase").lower()
+
 security = HTTPBearer()
 
+_supabase = None
+_supabase_lock = threading.Lock()
+
+def get_supabase():
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                from supabase import create_client
+                _supabase = create_client(url, key)
+    return _supabase
+
+_auth_client = None
+
+def get_auth_client():
+    # In lazy mode token checks only need GoTrue, not a full client with realtime and storage
+    global _auth_client
+    if not LAZY_STARTUP:
+        return get_supabase().auth
+    if _auth_client is None:
+        with _supabase_lock:
+            if _auth_client is None:
+                try:
+                    from supabase_auth import SyncGoTrueClient
+                except ImportError:
+                    from gotrue import SyncGoTrueClient
+                _auth_client = SyncGoTrueClient(
+                    url=f"{url.rstrip('/')}/auth/v1",
+                    headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+                    auto_refresh_token=False,
+                    persist_session=False,
+                )
+    return _auth_client
+
+if not LAZY_STARTUP:
+    supabase = get_supabase()
+
+def __getattr__(name):
+    # Keeps `from auth import supabase` working in lazy mode
+    if name == "supabase":
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def prewarm():
+    auth_client = get_auth_client()
+    if DATA_BACKEND == "sqlite":
+        # Open the database (and create the schema) before the first request
+        import sqlite_backend
+        sqlite_backend.get_database()
+    else:
+        # Import what the per-request clients need
+        import postgrest
+        import storage3
+    try:
+        # Any auth round trip opens the pooled connection get_current_user reuses;
+        # the dummy token is expected to be rejected
+        auth_client.get_user("prewarm")
+    except Exception:
+        pass
+
+class UserClient:
+    # Lightweight per-request client for lazy mode: only PostgREST and Storage,
+    # created on first access, instead of a full client with auth and realtime
+    def __init__(self, token: str):
+        self.headers = {"apiKey": key, "Authorization": f"Bearer {token}"}
+        self._postgrest = None
+        self._storage = None
+
+    @property
+    def postgrest(self):
+        if self._postgrest is None:
+            from postgrest import SyncPostgrestClient
+            self._postgrest = SyncPostgrestClient(f"{url.rstrip('/')}/rest/v1", headers=self.headers)
+        return self._postgrest
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from storage3 import SyncStorageClient
+            self._storage = SyncStorageClient(f"{url.rstrip('/')}/storage/v1", self.headers)
+        return self._storage
+
+    def table(self, table_name: str):
+        return self.postgrest.from_(table_name)
+
+    def rpc(self, fn: str, params: dict = None):
+        return self.postgrest.rpc(fn, params or {})
+
 def get_authenticated_client(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
+    if LAZY_STARTUP:
+        return UserClient(token)
     try:
+        from supabase import create_client
         # Create a new client for this request
         client = create_client(url, key)
         # Set the JWT token for PostgREST (Database)
         client.postgrest.auth(token)
-        
+
         # Set the JWT token for Storage
         # Supabase Python client storage implementation uses a separate session or headers
-        # We try to update the headers of the storage client's session if possible, 
+        # We try to update the headers of the storage client's session if possible,
         # or we rely on the fact that we might need to pass headers to upload.
         # However, looking at the library, updating the global headers of the client might work.
         client.options.headers.update({"Authorization": f"Bearer {token}"})
-        
+
         return client
     except Exception as e:
         raise HTTPException(
@@ -42,7 +151,7 @@ def get_authenticated_client(credentials: HTTPAuthorizationCredentials = Depends
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     try:
-        user = supabase.auth.get_user(token)
+        user = get_auth_client().get_user(token)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -56,3 +165,11 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail=f"Authentication failed: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+def get_local_client(user=Depends(get_current_user)):
+    # Embedded backend: the client only ever reads and writes this user's rows
+    import sqlite_backend
+    return sqlite_backend.get_database().client(user.id)
+
+if DATA_BACKEND == "sqlite":
+    get_authenticated_client = get_local_client
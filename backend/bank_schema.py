@@ -0,0 +1,112 @@
+import re
+from typing import List, Optional
+
+import msgspec
+
+# Typed schema for uploaded question banks:
+#   {"id": "...", "sets": [{"title": "...", "questions": [
+#       {"question": "...", "options": ["..."], "correctAnswer": "...",
+#        "passage": "...", "explanation": "..."}]}]}
+# The upload is decoded once (untyped, so unknown fields are kept and the
+# content is stored exactly as uploaded), then validated with msgspec.convert.
+# Structs are gc=False: they never form cycles, and skipping GC tracking
+# keeps large banks from triggering collections mid-decode.
+
+MAX_ERRORS = 50
+
+class Question(msgspec.Struct, gc=False):
+    question: str
+    options: List[str]
+    correctAnswer: str
+    passage: Optional[str] = None
+    explanation: Optional[str] = None
+
+    def __post_init__(self):
+        if len(self.options) < 2:
+            raise ValueError("options must have at least 2 entries")
+        if self.correctAnswer not in self.options:
+            raise ValueError("correctAnswer must be one of options")
+
+class QuestionSet(msgspec.Struct, gc=False):
+    questions: List[Question]
+    title: Optional[str] = None
+
+class Bank(msgspec.Struct, gc=False):
+    sets: List[QuestionSet]
+    id: Optional[str] = None
+
+_raw_decoder = msgspec.json.Decoder()
+
+class BankError(ValueError):
+    def __init__(self, detail, errors):
+        super().__init__(detail)
+        self.detail = detail
+        self.errors = errors
+
+def question_stats(question_counts):
+    # Same counts/range stored on the tests row
+    set_count = len(question_counts)
+    question_range = None
+    if set_count > 1:
+        min_q = min(question_counts)
+        max_q = max(question_counts)
+        question_range = f"{min_q}-{max_q}" if min_q != max_q else f"{min_q}"
+    return {
+        "set_count": set_count,
+        "question_count": sum(question_counts),
+        "question_range": question_range,
+    }
+
+def parse_bank(raw: bytes):
+    """Validate and decode a bank. Returns (content dict, stats) or raises BankError."""
+    try:
+        doc = _raw_decoder.decode(raw)
+    except msgspec.DecodeError as e:
+        raise BankError("Invalid JSON", [{"path": None, "set": None, "question": None, "detail": str(e)}]) from None
+    try:
+        bank = msgspec.convert(doc, Bank)
+    except msgspec.ValidationError as e:
+        # Find every bad question for the report
+        raise BankError("Invalid question bank", _collect_errors(doc, e)) from None
+    return doc, question_stats([len(s.questions) for s in bank.sets])
+
+_PATH_RE = re.compile(r" - at `\$(.*)`$")
+
+def _error(path, message, set_index=None, question_index=None):
+    match = _PATH_RE.search(message)
+    if match:
+        path += match.group(1)
+        message = message[:match.start()]
+    return {"path": path, "set": set_index, "question": question_index, "detail": message}
+
+def _collect_errors(doc, first_error):
+    if not isinstance(doc, dict) or not isinstance(doc.get("sets"), list):
+        return [_error("$", str(first_error))]
+
+    errors = []
+    for i, s in enumerate(doc["sets"]):
+        set_path = f"$.sets[{i}]"
+        if not isinstance(s, dict) or not isinstance(s.get("questions"), list):
+            errors.append(_error(set_path, str(_convert_error(s, QuestionSet)), i))
+            continue
+        title = s.get("title")
+        if title is not None and not isinstance(title, str):
+            errors.append(_error(f"{set_path}.title", "Expected `str`", i))
+        for j, q in enumerate(s["questions"]):
+            error = _convert_error(q, Question)
+            if error is not None:
+                errors.append(_error(f"{set_path}.questions[{j}]", str(error), i, j))
+            if len(errors) >= MAX_ERRORS:
+                return errors
+
+    if not errors:
+        # Not inside a question (e.g. a bad top-level id)
+        errors.append(_error("$", str(first_error)))
+    return errors
+
+def _convert_error(value, type_):
+    try:
+        msgspec.convert(value, type_)
+    except msgspec.ValidationError as e:
+        return e
+    return None
@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import time
+
+from bank_schema import parse_bank
+
+# Benchmark: decoding + stats for large question banks, the previous upload
+# path (json.loads + walking dicts, no validation) vs the msgspec schema.
+#
+#   python bench_bank_decode.py [questions] [repeats]
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(BACKEND_DIR, "..", "json", "Sample Test.json")
+
+def make_bank(n_questions):
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = json.load(f)
+    questions = [q for s in sample["sets"] for q in s["questions"]]
+    sets = []
+    per_set = 50
+    for i in range(0, n_questions, per_set):
+        chunk = []
+        for j in range(i, min(i + per_set, n_questions)):
+            q = dict(questions[j % len(questions)])
+            q["question"] = f"{j}. {q['question']}"
+            q["explanation"] = "Explanation " * 10
+            chunk.append(q)
+        sets.append({"title": f"Set {len(sets) + 1}", "questions": chunk})
+    return json.dumps({"id": "00000000-0000-0000-0000-000000000000", "sets": sets}).encode("utf-8")
+
+def old_path(raw):
+    json_content = json.loads(raw)
+    sets = json_content.get('sets', [])
+    set_count = len(sets)
+    question_counts = [len(s.get('questions', [])) for s in sets]
+    total_questions = sum(question_counts)
+    question_range = None
+    if set_count > 1:
+        min_q = min(question_counts) if question_counts else 0
+        max_q = max(question_counts) if question_counts else 0
+        question_range = f"{min_q}-{max_q}" if min_q != max_q else f"{min_q}"
+    return json_content, (set_count, total_questions, question_range)
+
+def old_path_validated(raw):
+    # The same checks as bank_schema, hand-written on top of json.loads
+    json_content, stats = old_path(raw)
+    if not isinstance(json_content, dict) or not isinstance(json_content.get('sets'), list):
+        raise ValueError("bad bank")
+    for s in json_content['sets']:
+        if not isinstance(s, dict) or not isinstance(s.get('questions'), list):
+            raise ValueError("bad set")
+        if not isinstance(s.get('title', ""), (str, type(None))):
+            raise ValueError("bad title")
+        for q in s['questions']:
+            if not isinstance(q, dict):
+                raise ValueError("bad question")
+            if not isinstance(q.get('question'), str) or not isinstance(q.get('correctAnswer'), str):
+                raise ValueError("bad question")
+            options = q.get('options')
+            if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, str) for o in options):
+                raise ValueError("bad options")
+            if q['correctAnswer'] not in options:
+                raise ValueError("bad correctAnswer")
+            for k in ('passage', 'explanation'):
+                if not isinstance(q.get(k), (str, type(None))):
+                    raise ValueError("bad " + k)
+    return json_content, stats
+
+def timeit(fn, raw, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [500, 5000, 50000]
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    print(f"{'questions':>10}{'size MB':>10}{'current ms':>12}{'+py checks ms':>15}{'msgspec ms':>12}{'vs checks':>11}")
+    for n in sizes:
+        raw = make_bank(n)
+        old = timeit(old_path, raw, repeats)
+        checked = timeit(old_path_validated, raw, repeats)
+        new = timeit(parse_bank, raw, repeats)
+        print(f"{n:>10}{len(raw) / 1e6:>10.2f}{old * 1000:>12.2f}{checked * 1000:>15.2f}{new * 1000:>12.2f}{checked / new:>10.2f}x")
+    print("\ncurrent: json.loads + counts, no validation (the old upload path)")
+    print("+py checks: current path plus the schema's checks written in Python")
+    print("msgspec: bank_schema.parse_bank (one untyped decode, validated with msgspec.convert)")
+
+if __name__ == "__main__":
+    main()
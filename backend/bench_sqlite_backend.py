@@ -0,0 +1,72 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+# Data-access latency of the embedded backend (DATA_BACKEND=sqlite): the
+# queries behind the dashboard, a test open and an attempt insert, run through
+# the same client interface main.py uses, on a synthetic library.
+#
+#   python bench_sqlite_backend.py [users] [tests per user] [attempts per test]
+
+import sqlite_backend
+
+def seed(db, users, tests_per_user, attempts_per_test):
+    rng = random.Random(0)
+    content = {"sets": [{"title": f"Set {s}", "questions": [
+        {"question": f"Q{q}", "options": ["a", "b", "c", "d"], "correctAnswer": "a"} for q in range(25)
+    ]} for s in range(4)]}
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    for user_id in user_ids:
+        client = db.client(user_id)
+        folders = client.table("folders").insert([{"name": f"Folder {i}"} for i in range(5)]).execute().data
+        tests = client.table("tests").insert([{
+            "title": f"Test {i}", "content": content, "folder_id": rng.choice(folders)['id'],
+            "question_count": 100, "set_count": 4, "question_range": "25",
+        } for i in range(tests_per_user)]).execute().data
+        client.table("test_attempts").insert([{
+            "test_id": t['id'], "score": rng.randint(0, 100), "total_questions": 100, "time_taken": rng.randint(60, 600),
+        } for t in tests for _ in range(attempts_per_test)]).execute()
+    return user_ids
+
+def timeit(fn, repeats=200):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.99) - 1]
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tests_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    attempts_per_test = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite_backend.Database(os.path.join(tmp, "bench.sqlite3"), os.path.join(tmp, "storage"))
+        start = time.perf_counter()
+        user_ids = seed(db, users, tests_per_user, attempts_per_test)
+        print(f"Seeded {users} users x {tests_per_user} tests x {attempts_per_test} attempts in {time.perf_counter() - start:.1f}s\n")
+
+        client = db.client(user_ids[0])
+        test_id = client.table("tests").select("id").limit(1).execute().data[0]['id']
+        queries = {
+            "folders (dashboard)": lambda: client.table("folders").select("*").order("name").execute(),
+            "tests id, folder_id": lambda: client.table("tests").select("id, folder_id").execute(),
+            "attempt stats": lambda: client.table("test_attempts").select("test_id, score, total_questions, is_reset").execute(),
+            "test metadata": lambda: client.table("tests").select("id, title, question_count, content_hash").eq("id", test_id).execute(),
+            "test content": lambda: client.table("tests").select("content").eq("id", test_id).execute(),
+            "attempts of test": lambda: client.table("test_attempts").select("*").eq("test_id", test_id).order("completed_at", desc=True).execute(),
+            "insert attempt": lambda: client.table("test_attempts").insert({"test_id": test_id, "score": 1, "total_questions": 2, "time_taken": 3}).execute(),
+        }
+        print(f"{'query':<22}{'rows':>6}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, fn in queries.items():
+            rows = len(fn().data)
+            p50, p99 = timeit(fn)
+            print(f"{name:<22}{rows:>6}{p50 * 1000:>10.3f}{p99 * 1000:>10.3f}")
+
+if __name__ == "__main__":
+    main()
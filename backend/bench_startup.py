@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Startup-time benchmark: runs `import main` in a fresh interpreter for the
+# eager and lazy (LAZY_STARTUP=1) modes and breaks the time down by module.
+#
+#   python bench_startup.py [runs] [top]
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child interpreter. Prints timings on stdout, -X importtime writes to stderr.
+CHILD = """
+import sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+print("phase: init", file=sys.stderr, flush=True)
+import auth
+auth.get_auth_client()
+t2 = time.perf_counter()
+client = auth.get_authenticated_client(type("C", (), {"credentials": "bench"})())
+client.table("tests")
+t3 = time.perf_counter()
+print(f"import_main {t1 - t0}")
+print(f"init_auth_client {t2 - t1}")
+print(f"first_request_client {t3 - t2}")
+"""
+
+def run_once(lazy):
+    env = dict(os.environ)
+    env.setdefault("SUPABASE_URL", "https://example.supabase.co")
+    env.setdefault("SUPABASE_KEY", "bench-key")
+    env["LAZY_STARTUP"] = "1" if lazy else "0"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit(f"benchmark child failed (lazy={lazy})")
+
+    timings = {}
+    for line in proc.stdout.splitlines():
+        name, _, value = line.partition(" ")
+        timings[name] = float(value)
+
+    # "import time: self [us] | cumulative | imported package", split into
+    # imports done by `import main` and those deferred to client init
+    modules = defaultdict(float)
+    phase = "import"
+    for line in proc.stderr.splitlines():
+        if line.startswith("phase: "):
+            phase = line[len("phase: "):]
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = [p.strip() for p in line[len("import time:"):].split("|")]
+        modules[(phase, name.split(".")[0])] += int(self_us) / 1e6
+    return timings, modules
+
+def bench(lazy, runs):
+    totals = defaultdict(float)
+    modules = defaultdict(float)
+    for _ in range(runs):
+        timings, mods = run_once(lazy)
+        for k, v in timings.items():
+            totals[k] += v / runs
+        for k, v in mods.items():
+            modules[k] += v / runs
+    return totals, modules
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+    results = {mode: bench(mode == "lazy", runs) for mode in ("eager", "lazy")}
+
+    print(f"Startup timings (mean of {runs} runs, ms)")
+    print(f"{'phase':<24}{'eager':>10}{'lazy':>10}")
+    for phase in ("import_main", "init_auth_client", "first_request_client"):
+        print(f"{phase:<24}{results['eager'][0][phase] * 1000:>10.1f}{results['lazy'][0][phase] * 1000:>10.1f}")
+
+    # Import time by top-level package, during `import main` vs deferred to init
+    print(f"\nImport time by top-level package (ms, top {top})")
+    print(f"{'package':<24}{'eager import':>14}{'eager init':>12}{'lazy import':>13}{'lazy init':>11}")
+    eager_mods, lazy_mods = results["eager"][1], results["lazy"][1]
+    packages = defaultdict(float)
+    for (_, name), value in list(eager_mods.items()) + list(lazy_mods.items()):
+        packages[name] += value
+    for name in sorted(packages, key=packages.get, reverse=True)[:top]:
+        row = [eager_mods.get(("import", name), 0), eager_mods.get(("init", name), 0),
+               lazy_mods.get(("import", name), 0), lazy_mods.get(("init", name), 0)]
+        print(f"{name:<24}{row[0] * 1000:>14.1f}{row[1] * 1000:>12.1f}{row[2] * 1000:>13.1f}{row[3] * 1000:>11.1f}")
+
+if __name__ == "__main__":
+    main()
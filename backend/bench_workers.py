@@ -0,0 +1,129 @@
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Throughput benchmark for multi-worker mode: N processes (like uvicorn
+# --workers N) serve the CPU-bound part of the dashboard and test-open paths
+# on synthetic data: without the SQLite cache shared between them, with it as
+# shipped (compressed content only), and with the opt-in stats cache
+# (STATS_CACHE_TTL > 0).
+# Supabase is not called; each "request" recomputes or reuses what a real one
+# would derive from its rows.
+#
+#   python bench_workers.py [seconds] [worker counts, e.g. 1,2,4]
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+USERS = 50
+TESTS_PER_USER = 20
+ATTEMPTS_PER_USER = 400
+QUESTIONS_PER_TEST = 200
+
+def make_data(seed=0):
+    rng = random.Random(seed)
+    users = {}
+    for u in range(USERS):
+        test_ids = [f"{u}-{t}" for t in range(TESTS_PER_USER)]
+        attempts = [{
+            "test_id": rng.choice(test_ids),
+            "score": rng.randint(0, 50),
+            "total_questions": 50,
+            "is_reset": rng.random() < 0.1,
+        } for _ in range(ATTEMPTS_PER_USER)]
+        users[f"user-{u}"] = (test_ids, attempts)
+    content = {"sets": [{"title": "Set 1", "questions": [{
+        "question": f"Question {i} " + "lorem ipsum " * 10,
+        "options": [f"Option {k} " + "dolor " * 5 for k in range(4)],
+        "correctAnswer": "Option 0 " + "dolor " * 5,
+        "explanation": "Because " * 20,
+    } for i in range(QUESTIONS_PER_TEST)]}]}
+    return users, content
+
+def worker(cache_path, stats_ttl, seconds, start, results):
+    # Imported here so SHARED_CACHE_PATH is read per process, as in a uvicorn worker
+    if cache_path:
+        os.environ["SHARED_CACHE_PATH"] = cache_path
+    else:
+        os.environ.pop("SHARED_CACHE_PATH", None)
+    sys.path.insert(0, BACKEND_DIR)
+    import content_cache
+    import shared_cache
+    import stats
+
+    users, content = make_data()
+    user_ids = list(users)
+    rng = random.Random(os.getpid())
+    tail = json.dumps({"title": "Bench", "last_accessed": None}).encode("utf-8")[1:]
+    content_hash = content_cache.build(content).content_hash
+
+    start.wait()
+    requests = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = rng.choice(user_ids)
+        test_ids, attempts = users[user_id]
+
+        # Dashboard: per-test stats
+        cached = shared_cache.cache.get("stats", user_id) if stats_ttl else None
+        if cached is None:
+            user_stats = stats.compute_test_stats(attempts)
+            if stats_ttl:
+                shared_cache.cache.set("stats", user_id, json.dumps(user_stats).encode("utf-8"), ttl=stats_ttl)
+        else:
+            user_stats = json.loads(cached)
+
+        # Test open: compressed content; the local cache only holds a fraction of all tests
+        test_id = rng.choice(test_ids)
+        entry = content_cache.get(test_id, content_hash)
+        if entry is None:
+            entry = content_cache.put(test_id, content_cache.build(content))
+        entry.render(tail, "br" if "br" in entry.encodings() else "gzip")
+        requests += 1
+
+    results.put((requests, shared_cache.cache.stats()))
+
+def run(workers, seconds, cache_path, stats_ttl):
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(cache_path, stats_ttl, seconds, start, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    time.sleep(1)  # let every process finish importing before the clock starts
+    start.set()
+    out = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    total = sum(r for r, _ in out)
+    hits = sum(s.get("hits", 0) for _, s in out)
+    misses = sum(s.get("misses", 0) for _, s in out)
+    return total / seconds, hits, misses
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if len(sys.argv) > 2:
+        counts = [int(n) for n in sys.argv[2].split(",")]
+    else:
+        counts = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    # (label, shared cache, stats TTL)
+    modes = [("local", False, 0), ("shared", True, 0), ("+stats", True, 5)]
+    print(f"{'workers':>8}{'cache':>8}{'req/s':>10}{'speedup':>9}{'hit rate':>10}")
+    for label, shared, stats_ttl in modes:
+        baseline = None
+        for n in counts:
+            with tempfile.TemporaryDirectory() as tmp:
+                cache_path = os.path.join(tmp, "cache.sqlite3") if shared else None
+                rps, hits, misses = run(n, seconds, cache_path, stats_ttl)
+            baseline = baseline or rps
+            hit_rate = f"{hits / (hits + misses):.0%}" if hits + misses else "-"
+            print(f"{n:>8}{label:>8}{rps:>10.0f}{rps / baseline:>8.2f}x{hit_rate:>10}")
+    print(f"\n{os.cpu_count()} CPUs; speedup is relative to 1 worker with the same cache mode")
+    print("local: no shared cache; shared: the default with WEB_CONCURRENCY > 1 (content only);")
+    print("+stats: shared plus the opt-in stats cache (STATS_CACHE_TTL=5)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+# Moves soft-reset attempts out of test_attempts into test_attempts_archive,
+# keeping one test_reset_events summary row per reset (migration_compaction.sql).
+#
+#   python compact_attempts.py            # every user
+#   python compact_attempts.py <user_id>  # one user
+
+load_dotenv()
+load_dotenv(".env.local", override=True)
+
+url: str = os.environ.get("SUPABASE_URL")
+key: str = os.environ.get("SUPABASE_SERVICE_KEY")
+
+if not url or not key:
+    print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env.local")
+    exit(1)
+
+supabase: Client = create_client(url, key)
+
+def compact(user_id=None):
+    response = supabase.rpc("compact_reset_attempts", {"target_user": user_id}).execute()
+    report = response.data[0]
+
+    print(f"Compacted reset attempts for {'user ' + user_id if user_id else 'all users'}")
+    print(f"  Rows archived:    {report['rows_archived']}")
+    print(f"  Reset events:     {report['reset_events']}")
+    print(f"  Bytes removed:    {report['bytes_removed']:,} from test_attempts")
+    print(f"  Bytes archived:   {report['bytes_archived']:,} in test_attempts_archive")
+    print(f"  Net reclaimed:    {report['bytes_removed'] - report['bytes_archived']:,} bytes")
+    if report['rows_archived']:
+        print("Freed space is reused after (auto)vacuum of test_attempts.")
+
+if __name__ == "__main__":
+    compact(sys.argv[1] if len(sys.argv) > 1 else None)
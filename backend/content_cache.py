@@ -0,0 +1,186 @@
+import hashlib
+import json
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import shared_cache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Pre-compressed variants of each test's serialized content.
+#
+# A test body is served as b'{"content":' + content + b',' + <metadata> + b'}'.
+# The metadata part (title, stats, last_accessed...) changes on every open, so
+# we compress the large content prefix once and only compress the small tail
+# per request:
+#   * gzip: the prefix is a raw deflate segment ended with a sync flush, the
+#     tail is a second, final deflate segment. CRC32 is carried over.
+#   * brotli: the prefix is a flushed (byte aligned) brotli stream, the tail
+#     is appended as uncompressed meta-blocks followed by the last empty block.
+
+CONTENT_PREFIX = b'{"content":'
+MAX_ENTRIES = 256
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+_BROTLI_MAX_META_BLOCK = 1 << 16
+# content_hash, crc, size, len(identity), len(gzip), len(br) (-1 = no brotli)
+_PACK_HEADER = struct.Struct("<64sIQQQq")
+
+_cache = OrderedDict()  # test_id -> ContentVariants
+_lock = threading.Lock()
+
+
+def serialize_content(content):
+    # Sorted keys so the bytes (and hash) don't depend on JSONB key order
+    return json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def hash_content(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+
+class ContentVariants:
+    def __init__(self, content_hash, raw=None):
+        self.content_hash = content_hash
+        if raw is None:
+            return  # filled in by unpack()
+        prefix = CONTENT_PREFIX + raw
+        self.identity = prefix
+        self.crc = zlib.crc32(prefix)
+        self.size = len(prefix)
+
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.gzip = compressor.compress(prefix) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        self.br = None
+        if brotli is not None:
+            compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+            self.br = compressor.process(prefix) + compressor.flush()
+
+    def encodings(self):
+        return ("br", "gzip") if self.br is not None else ("gzip",)
+
+    def pack(self):
+        # Flat binary layout for the cross-worker cache
+        br = self.br if self.br is not None else b""
+        header = _PACK_HEADER.pack(
+            self.content_hash.encode("ascii"), self.crc, self.size,
+            len(self.identity), len(self.gzip), len(self.br) if self.br is not None else -1,
+        )
+        return header + self.identity + self.gzip + br
+
+    @classmethod
+    def unpack(cls, data):
+        content_hash, crc, size, n_identity, n_gzip, n_br = _PACK_HEADER.unpack_from(data)
+        entry = cls(content_hash.decode("ascii"))
+        entry.crc = crc
+        entry.size = size
+        offset = _PACK_HEADER.size
+        entry.identity = bytes(data[offset:offset + n_identity])
+        offset += n_identity
+        entry.gzip = bytes(data[offset:offset + n_gzip])
+        offset += n_gzip
+        entry.br = bytes(data[offset:offset + n_br]) if n_br >= 0 else None
+        return entry
+
+    def render(self, tail, encoding=None):
+        # tail is everything after the content value, e.g. b',"id":"..."}'
+        if encoding == "gzip":
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+            crc = zlib.crc32(tail, self.crc)
+            size = (self.size + len(tail)) & 0xFFFFFFFF
+            return b"".join([
+                _GZIP_HEADER,
+                self.gzip,
+                compressor.compress(tail) + compressor.flush(),
+                struct.pack("<II", crc, size),
+            ])
+        if encoding == "br":
+            return self.br + _brotli_uncompressed_blocks(tail) + b"\x03"
+        return self.identity + tail
+
+
+def _brotli_uncompressed_blocks(data):
+    # RFC 7932 9.2: ISLAST=0, MNIBBLES=4, MLEN-1 (16 bits), ISUNCOMPRESSED=1,
+    # padded to a byte boundary, followed by MLEN raw bytes.
+    out = []
+    for start in range(0, len(data), _BROTLI_MAX_META_BLOCK):
+        chunk = data[start:start + _BROTLI_MAX_META_BLOCK]
+        header = ((len(chunk) - 1) << 3) | (1 << 19)
+        out.append(header.to_bytes(3, "little"))
+        out.append(chunk)
+    return b"".join(out)
+
+
+def get(test_id, content_hash):
+    with _lock:
+        entry = _cache.get(test_id)
+        if entry is not None and entry.content_hash == content_hash:
+            _cache.move_to_end(test_id)
+            return entry
+
+    # Another worker may already have built it
+    if content_hash is None:
+        return None
+    data = shared_cache.cache.get("content", test_id)
+    if data is None:
+        return None
+    entry = ContentVariants.unpack(data)
+    if entry.content_hash != content_hash:
+        return None
+    _store_local(test_id, entry)
+    return entry
+
+
+def build(content):
+    raw = serialize_content(content)
+    return ContentVariants(hash_content(raw), raw)
+
+
+def put(test_id, entry):
+    _store_local(test_id, entry)
+    shared_cache.cache.set("content", test_id, entry.pack())
+    return entry
+
+
+def _store_local(test_id, entry):
+    with _lock:
+        _cache[test_id] = entry
+        _cache.move_to_end(test_id)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def invalidate(test_id):
+    with _lock:
+        _cache.pop(test_id, None)
+    shared_cache.cache.delete("content", test_id)
+
+
+def choose_encoding(accept_encoding, available):
+    # Pick the best encoding we have a variant for, honouring q=0
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
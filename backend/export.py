@@ -0,0 +1,153 @@
+import json
+import zipfile
+
+# Streaming export of a user's library. Rows are paged out of Supabase with
+# keyset pagination and written out as they arrive, so memory use doesn't
+# depend on how many tests or attempts the user has.
+
+FORMATS = ("ndjson", "zip")
+
+FOLDER_COLUMNS = "id, name, parent_id, created_at"
+TEST_COLUMNS = "id, title, folder_id, is_starred, created_at, content, assembly"
+ATTEMPT_COLUMNS = "id, test_id, score, total_questions, time_taken, set_name, details, completed_at, is_reset"
+# Reset attempts moved out of test_attempts by compaction (migration_compaction.sql)
+ARCHIVED_ATTEMPT_COLUMNS = "id, test_id, score, total_questions, time_taken, set_name, completed_at, reset_at, archived_at"
+RESET_EVENT_COLUMNS = ("id, test_id, reset_at, attempt_count, avg_score, best_score, total_time_taken,"
+                       " first_completed_at, last_completed_at, compacted_at")
+
+# Tests carry their full content, so fetch them in smaller pages
+PAGE_SIZES = {"folders": 1000, "tests": 50, "test_attempts": 1000, "test_attempts_archive": 1000, "test_reset_events": 1000}
+
+# Attempt history, in both formats: (table, columns, ndjson type, zip member)
+HISTORY = [
+    ("test_attempts", ATTEMPT_COLUMNS, "attempt", "attempts.ndjson"),
+    ("test_attempts_archive", ARCHIVED_ATTEMPT_COLUMNS, "archived_attempt", "archive.ndjson"),
+    ("test_reset_events", RESET_EVENT_COLUMNS, "reset_event", "reset_events.ndjson"),
+]
+
+
+def iter_rows(client, table, columns, user_id):
+    page_size = PAGE_SIZES[table]
+    last_id = None
+    while True:
+        query = client.table(table).select(columns).eq("user_id", user_id)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def upload_shape(test):
+    # Same shape as the JSON files accepted by /upload, with the id first so a
+    # re-upload updates this test instead of creating a copy
+    content = test.get('content') or {}
+    data = {"id": test['id']}
+    data.update({k: v for k, v in content.items() if k != 'id'})
+    return data
+
+
+def _line(record):
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_ndjson(client, user_id, include_attempts=True):
+    for folder in iter_rows(client, "folders", FOLDER_COLUMNS, user_id):
+        yield _line({"type": "folder", **folder})
+    for test in iter_rows(client, "tests", TEST_COLUMNS, user_id):
+        yield _line({
+            "type": "test",
+            "id": test['id'],
+            "title": test['title'],
+            "folder_id": test['folder_id'],
+            "is_starred": test.get('is_starred', False),
+            "created_at": test['created_at'],
+            "assembly": test.get('assembly'), # Set for tests made by /folders/{id}/assemble
+            "content": upload_shape(test),
+        })
+    if include_attempts:
+        for table, columns, kind, _ in HISTORY:
+            for row in iter_rows(client, table, columns, user_id):
+                yield _line({"type": kind, **row})
+
+
+class _ZipStream:
+    # Write-only sink for ZipFile; without seek/tell it writes data descriptors
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _safe_name(name):
+    name = "".join("_" if c in '/\\:*?"<>|' or ord(c) < 32 else c for c in (name or "").strip())
+    return name.strip(". ") or "untitled"
+
+
+def _folder_paths(folders):
+    by_id = {f['id']: f for f in folders}
+    paths = {}
+
+    def path(fid):
+        if fid not in paths:
+            folder = by_id[fid]
+            parent = folder.get('parent_id')
+            name = _safe_name(folder['name'])
+            paths[fid] = f"{path(parent)}/{name}" if parent in by_id else name
+        return paths[fid]
+
+    for fid in by_id:
+        path(fid)
+    return paths
+
+
+def iter_zip(client, user_id, include_attempts=True):
+    # Layout mirrors the library: tests/<folder>/<subfolder>/<title>.json,
+    # each file uploadable as-is. Assembled practice tests go under practice/
+    # instead, so re-importing tests/ doesn't turn them into regular banks.
+    # folders.json and the attempt history
+    # (attempts.ndjson, archive.ndjson, reset_events.ndjson) alongside
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # Folders are needed up front for the paths, and are small
+        folders = list(iter_rows(client, "folders", FOLDER_COLUMNS, user_id))
+        zf.writestr("folders.json", json.dumps(folders, ensure_ascii=False, indent=2))
+        yield sink.drain()
+
+        paths = _folder_paths(folders)
+        used = set()
+        for test in iter_rows(client, "tests", TEST_COLUMNS, user_id):
+            folder_path = paths.get(test['folder_id'])
+            root = "practice" if test.get('assembly') is not None else "tests"
+            base = f"{root}/{folder_path}/" if folder_path else f"{root}/"
+            title = _safe_name(test['title'])
+            name = f"{base}{title}.json"
+            n = 2
+            while name in used:
+                name = f"{base}{title} ({n}).json"
+                n += 1
+            used.add(name)
+            zf.writestr(name, json.dumps(upload_shape(test), ensure_ascii=False, indent=2))
+            yield sink.drain()
+
+        if include_attempts:
+            for table, columns, _, member in HISTORY:
+                with zf.open(member, "w", force_zip64=True) as f:
+                    for row in iter_rows(client, table, columns, user_id):
+                        f.write(_line(row))
+                        if len(sink.chunks) > 64:
+                            yield sink.drain()
+                yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bank_schema import parse_bank, BankError
+import content_cache
+
+# Bulk ingest of a directory of question banks for one user:
+#   * subdirectories are mirrored into `folders` (created if missing)
+#   * banks without an id get one stamped into the file, like update_json_ids.py
+#   * every bank is validated (bank_schema) and hashed like /upload does
+#   * changed banks are uploaded in batches on a bounded thread pool
+#   * a manifest next to the files records what was uploaded, so a re-sync
+#     only reads and uploads files that changed
+#
+#   python ingest.py <directory> --user <user_id> [--folder <parent_folder_id>]
+#                    [--concurrency 8] [--batch-size 50] [--dry-run] [--force]
+#
+# Uses SUPABASE_SERVICE_KEY, so rows are written with an explicit user_id.
+
+MANIFEST_NAME = ".ingest-manifest.json"
+MAX_BATCH_BYTES = 8 * 1024 * 1024  # keep each request well under the API body limit
+
+
+def stamp_id(path, data):
+    # Insert a new id at the start of the bank and write it back
+    new_data = {"id": str(uuid.uuid4())}
+    new_data.update(data)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(new_data, f, indent=2)
+    return new_data
+
+
+def connect():
+    from supabase import create_client
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    load_dotenv(".env.local", override=True)
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY")
+    if not url or not key:
+        print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env.local")
+        sys.exit(1)
+    return url, create_client(url, key)
+
+
+def load_manifest(path, url, user_id):
+    # Only valid for the same project and user it was written for
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("url") != url or manifest.get("user_id") != user_id:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(path, url, user_id, files):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"url": url, "user_id": user_id, "files": files}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def scan(root):
+    # Relative directory -> .json files in it; hidden directories are skipped
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        rel = os.path.relpath(dirpath, root)
+        rel = "" if rel == "." else rel.replace(os.sep, "/")
+        banks = sorted(f for f in filenames if f.endswith(".json") and not f.startswith("."))
+        if banks:
+            found[rel] = banks
+    return found
+
+
+def sync_folders(client, user_id, parent_id, rel_dirs, dry_run):
+    # Relative directory -> folder id, creating missing folders one level at a time
+    existing = client.table("folders").select("id, name, parent_id").eq("user_id", user_id).execute().data
+    by_parent_name = {(f['parent_id'], f['name']): f['id'] for f in existing}
+
+    needed = set()
+    for rel in rel_dirs:
+        parts = rel.split("/") if rel else []
+        for i in range(1, len(parts) + 1):
+            needed.add("/".join(parts[:i]))
+
+    folder_ids = {"": parent_id}
+    created = 0
+    for depth in sorted({rel.count("/") for rel in needed}):
+        missing = []
+        for rel in sorted(r for r in needed if r.count("/") == depth):
+            parent_rel, _, name = rel.rpartition("/")
+            parent = folder_ids[parent_rel]
+            folder_id = by_parent_name.get((parent, name))
+            if folder_id:
+                folder_ids[rel] = folder_id
+            else:
+                missing.append((rel, {"user_id": user_id, "name": name, "parent_id": parent}))
+        if not missing:
+            continue
+        created += len(missing)
+        if dry_run:
+            for rel, _ in missing:
+                folder_ids[rel] = f"(new:{rel})"
+            continue
+        rows = client.table("folders").insert([row for _, row in missing]).execute().data
+        # Rows come back in insert order
+        for (rel, _), row in zip(missing, rows):
+            folder_ids[rel] = row['id']
+    return folder_ids, created
+
+
+def prepare(root, rel_dir, filename, folder_id, previous, stamp, force, dry_run):
+    # Returns (status, manifest entry, upload item or error)
+    rel_path = f"{rel_dir}/{filename}" if rel_dir else filename
+    path = os.path.join(root, *rel_path.split("/"))
+    st = os.stat(path)
+    if (not force and previous and previous.get("mtime_ns") == st.st_mtime_ns
+            and previous.get("size") == st.st_size and previous.get("folder_id") == folder_id):
+        return "unchanged", previous, None
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        content, stats = parse_bank(raw)
+    except BankError as e:
+        first = e.errors[0] if e.errors else {}
+        where = f" at {first['path']}" if first.get('path') else ""
+        return "invalid", None, f"{e.detail}{where}: {first.get('detail', '')}"
+
+    stamped = False
+    if not content.get('id'):
+        if not stamp:
+            return "invalid", None, "no id (run without --no-stamp to add one)"
+        if dry_run:
+            content = dict({"id": str(uuid.uuid4())}, **content)
+        else:
+            content = stamp_id(path, content)
+            st = os.stat(path)
+        stamped = True
+    try:
+        uuid.UUID(str(content['id']))
+    except ValueError:
+        return "invalid", None, f"id {content['id']!r} is not a UUID"
+
+    content_hash = content_cache.hash_content(content_cache.serialize_content(content))
+    entry = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "content_hash": content_hash,
+        "folder_id": folder_id,
+        "source_id": content['id'],
+        "test_id": previous.get("test_id") if previous else None,
+    }
+    if (not force and not stamped and previous and previous.get("content_hash") == content_hash
+            and previous.get("folder_id") == folder_id):
+        # Touched but not changed
+        return "unchanged", entry, None
+
+    item = {
+        "rel_path": rel_path,
+        "bytes": len(raw),
+        "row": {
+            "title": filename[:-len(".json")],
+            "content": content,
+            "folder_id": folder_id,
+            "question_count": stats['question_count'],
+            "set_count": stats['set_count'],
+            "question_range": stats['question_range'],
+            "content_hash": content_hash,
+        },
+    }
+    return ("stamped" if stamped else "changed"), entry, item
+
+
+def batches(items, batch_size):
+    batch, size = [], 0
+    for item in items:
+        if batch and (len(batch) >= batch_size or size + item['bytes'] > MAX_BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(item)
+        size += item['bytes']
+    if batch:
+        yield batch
+
+
+def upload_batch(client, user_id, batch):
+    # Same matching as /upload: an existing test whose id or source_id is the bank's id is updated
+    source_ids = [item['row']['content']['id'] for item in batch]
+    existing = {}
+    for column in ("source_id", "id"):
+        rows = client.table("tests").select("id, source_id").eq("user_id", user_id).in_(column, source_ids).execute().data
+        for row in rows:
+            existing[row[column]] = row['id']
+
+    inserts, updates = [], []
+    for item in batch:
+        row = dict(item['row'], user_id=user_id)
+        source_id = row['content']['id']
+        if source_id in existing:
+            updates.append((item, dict(row, id=existing[source_id])))
+        else:
+            inserts.append((item, dict(row, source_id=source_id)))
+
+    results = []
+    if updates:
+        client.table("tests").upsert([row for _, row in updates], on_conflict="id").execute()
+        results.extend((item, row['id'], "updated") for item, row in updates)
+    if inserts:
+        rows = client.table("tests").insert([row for _, row in inserts]).execute().data
+        results.extend((item, row['id'], "created") for (item, _), row in zip(inserts, rows))
+    return results
+
+
+def ingest(root, user_id, parent_id=None, concurrency=8, batch_size=50, dry_run=False, force=False, stamp=True):
+    url, client = connect()
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path, url, user_id)
+    counts = {"unchanged": 0, "stamped": 0, "changed": 0, "invalid": 0, "created": 0, "updated": 0, "failed": 0}
+
+    start = time.perf_counter()
+    found = scan(root)
+    folder_ids, folders_created = sync_folders(client, user_id, parent_id, found.keys(), dry_run)
+
+    files = {}
+    items = []
+    seen_ids = {}
+    for rel_dir, filenames in found.items():
+        for filename in filenames:
+            rel_path = f"{rel_dir}/{filename}" if rel_dir else filename
+            try:
+                status, entry, result = prepare(root, rel_dir, filename, folder_ids[rel_dir], manifest.get(rel_path), stamp, force, dry_run)
+            except OSError as e:
+                status, entry, result = "invalid", None, str(e)
+            if entry and entry['source_id'] in seen_ids:
+                status, entry, result = "invalid", None, f"same id as {seen_ids[entry['source_id']]}"
+            counts[status] += 1
+            if entry:
+                seen_ids[entry['source_id']] = rel_path
+            if status == "invalid":
+                print(f"  invalid  {rel_path}: {result}")
+            elif status == "unchanged":
+                files[rel_path] = entry
+            else:
+                items.append(result)
+                # Recorded once the upload succeeds
+                files[rel_path] = dict(entry, pending=True)
+    scanned = time.perf_counter()
+
+    uploaded_bytes = 0
+    if items and not dry_run:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(upload_batch, client, user_id, batch): batch for batch in batches(items, batch_size)}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    counts["failed"] += len(batch)
+                    for item in batch:
+                        files.pop(item['rel_path'], None)
+                        print(f"  failed   {item['rel_path']}: {e}")
+                    continue
+                for item, test_id, status in results:
+                    counts[status] += 1
+                    uploaded_bytes += item['bytes']
+                    entry = files[item['rel_path']]
+                    entry.pop("pending", None)
+                    entry["test_id"] = test_id
+    uploaded = time.perf_counter()
+
+    if not dry_run:
+        save_manifest(manifest_path, url, user_id, {k: v for k, v in files.items() if not v.get("pending")})
+
+    total = sum(counts[k] for k in ("unchanged", "stamped", "changed", "invalid"))
+    scan_time = scanned - start
+    upload_time = uploaded - scanned
+    print(f"\n{'Dry run: ' if dry_run else ''}{total} banks in {len(found)} directories under {root}")
+    print(f"  Folders created:  {folders_created}")
+    print(f"  Unchanged:        {counts['unchanged']}")
+    print(f"  Ids stamped:      {counts['stamped']}")
+    print(f"  Invalid:          {counts['invalid']}")
+    print(f"  To upload:        {len(items)}")
+    if not dry_run:
+        print(f"  Created:          {counts['created']}")
+        print(f"  Updated:          {counts['updated']}")
+        print(f"  Failed:           {counts['failed']}")
+    print(f"  Scan + validate:  {scan_time:.2f}s ({total / scan_time if scan_time else 0:.0f} files/s)")
+    if items and not dry_run:
+        print(f"  Upload:           {upload_time:.2f}s ({len(items) / upload_time:.1f} files/s, "
+              f"{uploaded_bytes / 1e6 / upload_time:.2f} MB/s, concurrency {concurrency})")
+    print(f"  Total:            {uploaded - start:.2f}s")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload a directory of question banks, mirroring its folders.")
+    parser.add_argument("directory")
+    parser.add_argument("--user", required=True, help="id of the user who will own the tests")
+    parser.add_argument("--folder", help="folder to ingest into (default: top level)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="validate and report, change nothing")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and upload every bank")
+    parser.add_argument("--no-stamp", action="store_true", help="report banks without an id instead of writing one")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Directory not found: {args.directory}")
+        sys.exit(1)
+    counts = ingest(
+        os.path.abspath(args.directory), args.user, args.folder,
+        concurrency=max(1, args.concurrency), batch_size=max(1, args.batch_size),
+        dry_run=args.dry_run, force=args.force, stamp=not args.no_stamp,
+    )
+    sys.exit(1 if counts["invalid"] or counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import json
+import random
+import re
 import uuid
-from datetime import datetime
-from auth import get_current_user, get_authenticated_client, supabase
-
-app = FastAPI()
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from auth import get_current_user, get_authenticated_client, prewarm, PREWARM_CONNECTIONS
+import content_cache
+import trends
+import singleflight
+import shared_cache
+import stats
+import export
+import assembly
+from bank_schema import parse_bank, BankError
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PREWARM_CONNECTIONS:
+        await run_in_threadpool(prewarm)
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 import os
 
@@ -36,6 +56,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress everything else above ~1KB. Routes whose bodies are already
+# compressed are routed around the middleware: older Starlette versions
+# re-gzip a response even when it carries Content-Encoding.
+PRECOMPRESSED_ROUTES = [
+    ("GET", re.compile(r"^/tests/[^/]+$"), None), # get_test: br/gzip test content
+    ("GET", re.compile(r"^/export$"), re.compile(r"(^|&)format=zip(&|$)")), # deflated ZIP members
+]
+
+class SelectiveGZipMiddleware:
+    def __init__(self, app, minimum_size=500):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            query = scope.get("query_string", b"").decode("latin-1")
+            for method, path, params in PRECOMPRESSED_ROUTES:
+                if scope["method"] == method and path.match(scope["path"]) and (params is None or params.search(query)):
+                    return await self.app(scope, receive, send)
+        await self.gzip(scope, receive, send)
+
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1000)
+
 # --- Pydantic Models ---
 
 class Folder(BaseModel):
@@ -75,12 +118,24 @@ class Test(BaseModel):
 class TestDetail(Test):
     content: dict
 
+# Everything get_test needs except the (large) content column
+TEST_META_COLUMNS = "id, title, created_at, folder_id, is_starred, last_accessed, question_count, set_count, question_range, source_id, content_hash"
+
 class TestUpdate(BaseModel):
     title: Optional[str] = None
     folder_id: Optional[str] = None
     is_starred: Optional[bool] = None
     last_accessed: Optional[str] = None
 
+class ContentPatchResult(BaseModel):
+    question_count: int
+    set_count: int
+    question_range: Optional[str] = None
+
+# RFC 6902 operations and the members each one needs besides "path"
+PATCH_OPS = {"add": "value", "remove": None, "replace": "value", "move": "from", "copy": "from", "test": "value"}
+MAX_PATCH_OPS = 500
+
 class TestAttemptCreate(BaseModel):
     test_id: str
     score: int
@@ -95,52 +150,141 @@ class TestAttempt(TestAttemptCreate):
     test_title: Optional[str] = None
     is_reset: bool = False
 
+class TrendPoint(BaseModel):
+    start: str
+    end: str
+    attempt_count: int
+    avg_score: Optional[float] = None
+    avg_time_taken: Optional[float] = None
+    rolling_avg_score: Optional[float] = None
+    rolling_avg_time_taken: Optional[float] = None
+
+class Trend(BaseModel):
+    bucket: str
+    attempt_count: int = 0
+    avg_score: Optional[float] = None
+    avg_time_taken: Optional[float] = None
+    points: List[TrendPoint] = []
+
+class CompactionReport(BaseModel):
+    rows_archived: int
+    reset_events: int
+    bytes_removed: int # Row bytes moved out of test_attempts
+    bytes_archived: int # Row bytes added to test_attempts_archive
+
+class TestAttemptBatchItem(TestAttemptCreate):
+    id: str # Client-generated UUID, makes retries idempotent
+    completed_at: Optional[str] = None # ISO 8601, when the attempt was actually finished (offline)
+
+class TestAttemptBatch(BaseModel):
+    attempts: List[TestAttemptBatchItem]
+
+class TestAttemptBatchResult(BaseModel):
+    inserted: List[str] = []
+    duplicates: List[str] = [] # Already recorded by an earlier (retried) batch
+    rejected: List[dict] = [] # {"id", "detail"}
+
+MAX_BATCH_ATTEMPTS = 500
+
+class AssembleRequest(BaseModel):
+    count: int
+    stratify: Optional[str] = None # "test", "set", or null to sample the folder uniformly
+    seed: Optional[int] = None # Same seed and folder contents give the same questions
+    title: Optional[str] = None
+
+class AssembledTest(BaseModel):
+    id: str # A saved test; record attempts against it with POST /attempts
+    title: str
+    folder_id: str
+    seed: int
+    stratify: Optional[str] = None
+    question_count: int
+    available: int # Questions in the folder and its subfolders
+    questions: List[dict]
+
+MAX_ASSEMBLE_QUESTIONS = 500
+
+ARCHIVED_ATTEMPT_COLUMNS = "id, test_id, score, total_questions, time_taken, set_name, completed_at"
+
+# Columns the dashboard needs to compute per-test stats
+ATTEMPT_STATS_COLUMNS = "test_id, score, total_questions, is_reset"
+
+# With several workers, a write through one worker can only reach another
+# worker's cached single-flight results through the shared cache: they are
+# keyed on the generation invalidate_user_caches bumps there. Without a shared
+# cache nothing could invalidate them, so only in-flight calls are shared.
+if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 and not shared_cache.cache.enabled:
+    singleflight.flights.cache_ttl = 0
+
+def shared_query(user, name, query, shape=None):
+    # Identical queries running at the same time for the same user (get_folders and
+    # get_tests on dashboard load, re-renders, several tabs) share one upstream call.
+    # shape(row) trims each row before it is shared (and possibly cached).
+    # Rows are copied since the endpoints annotate them in place.
+    def run():
+        rows = query.execute().data
+        return [shape(row) for row in rows] if shape else rows
+    key = (user.id, name)
+    if singleflight.flights.cache_ttl > 0 and shared_cache.cache.enabled:
+        key += (shared_cache.cache.generation("stats", user.id),)
+    rows = singleflight.flights.do(key, run)
+    return [dict(row) for row in rows]
+
+# How long per-user stats stay in the cross-worker cache (0, the default, turns
+# it off). Writes made through this container invalidate them right away, but
+# writes that went to another Cloud Run instance only show up once the entry
+# expires, so keep it to a few seconds.
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", "0"))
+
+def get_user_test_stats(user, client):
+    if STATS_CACHE_TTL <= 0:
+        attempts_data = shared_query(user, "attempt_stats", client.table("test_attempts").select(ATTEMPT_STATS_COLUMNS))
+        return stats.compute_test_stats(attempts_data)
+    cached = shared_cache.cache.get("stats", user.id)
+    if cached is not None:
+        return json.loads(cached)
+    # Read before querying: if a write invalidates meanwhile, the result isn't stored
+    generation = shared_cache.cache.generation("stats", user.id)
+    attempts_data = shared_query(user, "attempt_stats", client.table("test_attempts").select(ATTEMPT_STATS_COLUMNS))
+    test_stats = stats.compute_test_stats(attempts_data)
+    shared_cache.cache.set("stats", user.id, json.dumps(test_stats).encode("utf-8"), ttl=STATS_CACHE_TTL, generation=generation)
+    return test_stats
+
+def invalidate_user_caches(user_id):
+    # Call after any write that can change a user's folders, tests or stats
+    singleflight.flights.forget(user_id)
+    # Also moves every worker's single-flight results for the user to a new key
+    shared_cache.cache.bump("stats", user_id)
+
 # --- Endpoints ---
 
 @app.get("/")
 def read_root():
     return {"message": "Test Taker API"}
 
+@app.get("/metrics/upstream")
+def get_upstream_metrics(user=Depends(get_current_user)):
+    # How many upstream queries were coalesced or served from the short-lived cache,
+    # and hit/miss counts of this worker's view of the cross-worker cache. The
+    # counters cover every user served by this worker process, not just the caller.
+    return {"scope": "worker", **singleflight.flights.stats(), "shared_cache": shared_cache.cache.stats()}
+
 # --- Folders ---
 
 @app.get("/folders", response_model=List[Folder])
 def get_folders(user=Depends(get_current_user), client=Depends(get_authenticated_client)):
     # Fetch all folders
-    folders_resp = client.table("folders").select("*").order("name").execute()
-    folders_data = folders_resp.data
-    
-    # Fetch all tests (lightweight)
-    tests_resp = client.table("tests").select("id, folder_id").execute()
-    tests_data = tests_resp.data
+    folders_data = shared_query(user, "folders", client.table("folders").select("*").order("name"))
     
-    # Fetch all attempts for stats
-    attempts_resp = client.table("test_attempts").select("test_id, score, total_questions, is_reset").execute()
-    attempts_data = attempts_resp.data
+    # Fetch all tests (lightweight); assembled practice tests don't count towards folders
+    tests_data = shared_query(user, "test_folders", client.table("tests").select("id, folder_id").is_("assembly", "null"))
     
-    # Pre-calculate test stats
+    # Per-test stats from all attempts
+    user_stats = get_user_test_stats(user, client)
     test_stats = {} # test_id -> avg_score
-    attempts_by_test = {}
-    for a in attempts_data:
-        if a['test_id'] not in attempts_by_test:
-            attempts_by_test[a['test_id']] = []
-        attempts_by_test[a['test_id']].append(a)
-        
     for t in tests_data:
-        t_attempts = attempts_by_test.get(t['id'], [])
-        if t_attempts:
-            percentages = []
-            for a in t_attempts:
-                if a.get('is_reset', False): continue
-                if a['total_questions'] > 0:
-                    percentages.append((a['score'] / a['total_questions']) * 100)
-                else:
-                    percentages.append(0)
-            if percentages:
-                test_stats[t['id']] = sum(percentages) / len(percentages)
-            else:
-                test_stats[t['id']] = None
-        else:
-            test_stats[t['id']] = None
+        t_stats = user_stats.get(t['id'])
+        test_stats[t['id']] = t_stats['avg_score'] if t_stats else None
 
     # Build trees
     folder_map = {f['id']: f for f in folders_data}
@@ -254,6 +398,7 @@ def create_folder(folder: FolderCreate, user=Depends(get_current_user), client=D
         "parent_id": folder.parent_id
     }
     response = client.table("folders").insert(data).execute()
+    invalidate_user_caches(user.id)
     return response.data[0]
 
 @app.patch("/folders/{folder_id}", response_model=Folder)
@@ -265,6 +410,7 @@ def update_folder(folder_id: str, folder: FolderUpdate, user=Depends(get_current
     response = client.table("folders").update(data).eq("id", folder_id).execute()
     if not response.data:
          raise HTTPException(status_code=404, detail="Folder not found")
+    invalidate_user_caches(user.id)
     return response.data[0]
 
 @app.delete("/folders/{folder_id}")
@@ -286,63 +432,134 @@ def delete_folder(folder_id: str, move_contents: bool = False, user=Depends(get_
     # Delete the folder
     # If move_contents is False, ON DELETE CASCADE will handle deleting contents
     response = client.table("folders").delete().eq("id", folder_id).execute()
+    invalidate_user_caches(user.id)
     return {"message": "Folder deleted"}
 
+def require_folder(client, folder_id):
+    # 404 unless the folder exists and is the user's
+    try:
+        uuid.UUID(folder_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    if not client.table("folders").select("id").eq("id", folder_id).execute().data:
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+@app.get("/folders/{folder_id}/trend", response_model=Trend)
+def get_folder_trend(folder_id: str, bucket: str = "day", points: int = 60, window: int = 7, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    validate_trend_params(bucket, points, window)
+    require_folder(client, folder_id)
+    
+    # Tests from all subfolders, but not assembled practice tests; merged in the
+    # database (migration_trend_series.sql), at most `points` rows come back
+    params = {"folder": folder_id, "bucket": bucket, "points": points}
+    rows = client.rpc("score_trend", params).execute().data
+    return trends.build_series(rows, bucket, window)
+
+@app.post("/folders/{folder_id}/assemble", response_model=AssembledTest)
+def assemble_test(folder_id: str, options: AssembleRequest, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    # Randomized practice test drawn from every bank in the folder and its subfolders.
+    # Sampling uses the question index (set counts), only the chosen questions are fetched.
+    if options.stratify is not None and options.stratify not in assembly.STRATIFY:
+        raise HTTPException(status_code=400, detail=f"stratify must be one of: {', '.join(assembly.STRATIFY)}")
+    if options.count < 1 or options.count > MAX_ASSEMBLE_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_ASSEMBLE_QUESTIONS}")
+    
+    require_folder(client, folder_id)
+    # One set per row, from the folder and its subfolders (migration_trend_series.sql)
+    index_rows = client.rpc("folder_question_index", {"folder": folder_id}).execute().data or []
+    available = sum(r['question_count'] for r in index_rows)
+    if not available:
+        raise HTTPException(status_code=400, detail="Folder has no questions")
+    
+    seed = options.seed if options.seed is not None else random.randrange(2**31)
+    picks = assembly.sample(index_rows, options.count, seed, options.stratify)
+    picked = client.rpc("pick_questions", {"picks": picks}).execute().data
+    
+    questions = []
+    for p in picked:
+        if not isinstance(p['question'], dict):
+            continue
+        # Keep where each question came from, for review
+        question = dict(p['question'])
+        question['source'] = {"test_id": p['test_id'], "set_index": p['set_index'], "question_index": p['question_index']}
+        questions.append(question)
+    
+    # Saved as a test in the folder, so it can be opened and attempted like any other.
+    # It's marked is_assembled in /tests and left out of folder counts, averages and trends.
+    title = options.title or f"Mixed practice ({len(questions)} questions)"
+    content = {"sets": [{"title": title, "questions": questions}]}
+    variants = content_cache.build(content)
+    data = {
+        "user_id": user.id,
+        "title": title,
+        "content": content,
+        "folder_id": folder_id,
+        "question_count": len(questions),
+        "set_count": 1,
+        "question_range": None,
+        "content_hash": variants.content_hash,
+        "assembly": {"folder_id": folder_id, "seed": seed, "stratify": options.stratify, "count": options.count}
+    }
+    response = client.table("tests").insert(data).execute()
+    test_id = response.data[0]['id']
+    content_cache.put(test_id, variants)
+    invalidate_user_caches(user.id)
+    
+    return {
+        "id": test_id,
+        "title": title,
+        "folder_id": folder_id,
+        "seed": seed,
+        "stratify": options.stratify,
+        "question_count": len(questions),
+        "available": available,
+        "questions": questions,
+    }
+
 @app.post("/tests/{test_id}/reset_stats")
 def reset_test_stats(test_id: str, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
     # Soft reset: Mark all attempts as reset and clear review content
-    client.table("test_attempts").update({"is_reset": True, "details": None}).eq("test_id", test_id).execute()
+    # reset_at groups them into one reset event when they are compacted later
+    reset_data = {"is_reset": True, "details": None, "reset_at": datetime.now(timezone.utc).isoformat()}
+    client.table("test_attempts").update(reset_data).eq("test_id", test_id).eq("is_reset", False).execute()
+    invalidate_user_caches(user.id)
     return {"message": "Stats reset successfully"}
 
+@app.post("/attempts/compact", response_model=CompactionReport)
+def compact_attempts(user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    # Move this user's reset attempts into the archive (see migration_compaction.sql)
+    response = client.rpc("compact_reset_attempts", {"target_user": user.id}).execute()
+    invalidate_user_caches(user.id)
+    return response.data[0]
+
+def test_list_row(t):
+    # Set titles instead of the content they come from, to keep the payload
+    # (and what shared_query holds on to) small
+    content = t.pop('content', None)
+    if content and 'sets' in content:
+        t['sets'] = [{'title': s.get('title', f'Set {i+1}')} for i, s in enumerate(content['sets'])]
+    else:
+        t['sets'] = []
+    # Generated by /folders/{id}/assemble, not an uploaded bank
+    t['is_assembled'] = t.pop('assembly', None) is not None
+    return t
+
 @app.get("/tests", response_model=List[Dict])
 def get_tests(user=Depends(get_current_user), client=Depends(get_authenticated_client)):
     # Fetch tests with content to extract set titles
-    response = client.table("tests").select("id, title, created_at, folder_id, is_starred, last_accessed, question_count, set_count, question_range, content").eq("user_id", user.id).execute()
-    tests_data = response.data
-    
-    # Fetch all attempts for stats
-    attempts_resp = client.table("test_attempts").select("test_id, score, total_questions, is_reset").execute()
-    attempts_data = attempts_resp.data
+    tests_data = shared_query(user, "tests", client.table("tests").select("id, title, created_at, folder_id, is_starred, last_accessed, question_count, set_count, question_range, content, assembly").eq("user_id", user.id), shape=test_list_row)
     
-    # Pre-calculate test stats
-    test_stats = {} # test_id -> avg_score
-    attempts_by_test = {}
-    for a in attempts_data:
-        if a['test_id'] not in attempts_by_test:
-            attempts_by_test[a['test_id']] = []
-        attempts_by_test[a['test_id']].append(a)
+    # Per-test stats from all attempts
+    user_stats = get_user_test_stats(user, client)
         
     for t in tests_data:
-        # Extract set titles
-        if t.get('content') and 'sets' in t['content']:
-            t['sets'] = [{'title': s.get('title', f'Set {i+1}')} for i, s in enumerate(t['content']['sets'])]
-        else:
-            t['sets'] = []
-        
-        # Remove content to reduce payload size
-        if 'content' in t:
-            del t['content']
-
-        t_attempts = attempts_by_test.get(t['id'], [])
-        # Count non-reset attempts
-        non_reset_attempts = [a for a in t_attempts if not a.get('is_reset', False)]
-        t['attempt_count'] = len(non_reset_attempts)
-        
-        if non_reset_attempts:
-            percentages = []
-            for a in non_reset_attempts:
-                if a['total_questions'] > 0:
-                    percentages.append((a['score'] / a['total_questions']) * 100)
-                else:
-                    percentages.append(0)
-            if percentages:
-                t['avg_score'] = round(sum(percentages) / len(percentages))
-                t['best_score'] = round(max(percentages))
-                t['last_score'] = round(percentages[0])
-            else:
-                t['avg_score'] = None
-                t['best_score'] = None
-                t['last_score'] = None
+        # Stats only exist for tests with non-reset attempts
+        t_stats = user_stats.get(t['id'])
+        if t_stats:
+            t['attempt_count'] = t_stats['attempt_count']
+            t['avg_score'] = round(t_stats['avg_score'])
+            t['best_score'] = round(t_stats['best_score'])
+            t['last_score'] = round(t_stats['last_score'])
         else:
             t['attempt_count'] = 0
             t['avg_score'] = None
@@ -352,15 +569,25 @@ def get_tests(user=Depends(get_current_user), client=Depends(get_authenticated_c
     return tests_data
 
 @app.get("/tests/{test_id}", response_model=TestDetail)
-def get_test(test_id: str, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
-    response = client.table("tests").select("*").eq("id", test_id).execute()
+def get_test(test_id: str, request: Request, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    # Fetch metadata only, content comes from the compressed cache when its hash matches
+    response = client.table("tests").select(TEST_META_COLUMNS).eq("id", test_id).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    # Update last_accessed
-    client.table("tests").update({"last_accessed": datetime.now().isoformat()}).eq("id", test_id).execute()
-    
     test = response.data[0]
+    updates = {"last_accessed": datetime.now().isoformat()}
+    
+    variants = content_cache.get(test_id, test.get('content_hash'))
+    if variants is None:
+        content_resp = client.table("tests").select("content").eq("id", test_id).execute()
+        variants = content_cache.put(test_id, content_cache.build(content_resp.data[0]['content']))
+        # Backfill the hash for rows uploaded before content_hash existed
+        if test.get('content_hash') != variants.content_hash:
+            updates['content_hash'] = variants.content_hash
+    
+    # Update last_accessed
+    client.table("tests").update(updates).eq("id", test_id).execute()
     
     # Calculate stats for this single test
     attempts_response = client.table("test_attempts").select("*").eq("test_id", test_id).order("completed_at", desc=True).execute()
@@ -374,7 +601,31 @@ def get_test(test_id: str, user=Depends(get_current_user), client=Depends(get_au
             test['best_score'] = max(percentages)
             test['last_score'] = percentages[0] # First one is latest due to desc order
     
-    return test
+    # Splice the metadata after the pre-compressed content
+    tail = b"," + json.dumps(Test(**test).dict())[1:].encode("utf-8")
+    encoding = content_cache.choose_encoding(request.headers.get("accept-encoding"), variants.encodings())
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=variants.render(tail, encoding), media_type="application/json", headers=headers)
+
+def validate_trend_params(bucket: str, points: int, window: int):
+    if bucket not in trends.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(trends.BUCKETS)}")
+    if not 1 <= points <= 366 or not 1 <= window <= points:
+        raise HTTPException(status_code=400, detail="points must be 1-366 and window 1-points")
+
+@app.get("/tests/{test_id}/trend", response_model=Trend)
+def get_test_trend(test_id: str, bucket: str = "day", points: int = 60, window: int = 7, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    validate_trend_params(bucket, points, window)
+    
+    test_resp = client.table("tests").select("id").eq("id", test_id).execute()
+    if not test_resp.data:
+        raise HTTPException(status_code=404, detail="Test not found")
+    
+    # Daily rollups maintained by the test_attempts triggers (migration_trends.sql)
+    rows = client.rpc("score_trend", {"test": test_id, "bucket": bucket, "points": points}).execute().data
+    return trends.build_series(rows, bucket, window)
 
 @app.patch("/tests/{test_id}", response_model=Test)
 def update_test(test_id: str, test: TestUpdate, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
@@ -385,11 +636,45 @@ def update_test(test_id: str, test: TestUpdate, user=Depends(get_current_user),
     response = client.table("tests").update(data).eq("id", test_id).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Test not found")
+    invalidate_user_caches(user.id)
+    return response.data[0]
+
+@app.patch("/tests/{test_id}/content", response_model=ContentPatchResult)
+def patch_test_content(test_id: str, ops: List[dict], user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    # JSON Patch (RFC 6902) applied in the database (patch_test_content, see migration_content_patch.sql),
+    # so fixing one question doesn't mean re-uploading the bank
+    if not ops:
+        raise HTTPException(status_code=400, detail="No operations")
+    if len(ops) > MAX_PATCH_OPS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PATCH_OPS} operations per patch")
+    for i, op in enumerate(ops):
+        if op.get('op') not in PATCH_OPS:
+            raise HTTPException(status_code=400, detail=f"Operation {i}: op must be one of: {', '.join(PATCH_OPS)}")
+        required = PATCH_OPS[op['op']]
+        if not isinstance(op.get('path'), str) or (required and required not in op):
+            raise HTTPException(status_code=400, detail=f"Operation {i}: '{op['op']}' needs path{' and ' + required if required else ''}")
+    
+    exists = client.table("tests").select("id").eq("id", test_id).execute()
+    if not exists.data:
+        raise HTTPException(status_code=404, detail="Test not found")
+    
+    try:
+        response = client.rpc("patch_test_content", {"target": test_id, "ops": ops}).execute()
+    except Exception as e:
+        # Nothing is written unless every operation applies and the touched sets are still valid
+        raise HTTPException(status_code=422, detail=getattr(e, "message", None) or str(e))
+    
+    # The stored content_hash was cleared, drop the compressed copy too;
+    # attempt stats are unaffected, only the cached test lists
+    content_cache.invalidate(test_id)
+    singleflight.flights.forget(user.id)
     return response.data[0]
 
 @app.delete("/tests/{test_id}")
 def delete_test(test_id: str, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
     response = client.table("tests").delete().eq("id", test_id).execute()
+    content_cache.invalidate(test_id)
+    invalidate_user_caches(user.id)
     return {"message": "Test deleted"}
 
 @app.post("/upload")
@@ -402,26 +687,20 @@ async def upload_files(files: List[UploadFile] = File(...), folder_id: Optional[
         
         if file.filename.endswith(".json"):
             try:
-                json_content = json.loads(content)
+                # Decode and validate against the bank schema in one pass
+                json_content, stats = parse_bank(content)
                 title = file.filename.replace(".json", "")
                 
                 # Extract ID if present
                 test_id = json_content.get('id')
                 
-                # Calculate stats
-                sets = json_content.get('sets', [])
-                set_count = len(sets)
-                question_counts = [len(s.get('questions', [])) for s in sets]
-                total_questions = sum(question_counts)
+                # Stats were computed while decoding
+                set_count = stats['set_count']
+                total_questions = stats['question_count']
+                question_range = stats['question_range']
                 
-                question_range = None
-                if set_count > 1:
-                    min_q = min(question_counts) if question_counts else 0
-                    max_q = max(question_counts) if question_counts else 0
-                    if min_q != max_q:
-                        question_range = f"{min_q}-{max_q}"
-                    else:
-                        question_range = f"{min_q}"
+                # Compress once here so the first open is already served from cache
+                variants = content_cache.build(json_content)
                 
                 data = {
                     "user_id": user_id,
@@ -430,7 +709,8 @@ async def upload_files(files: List[UploadFile] = File(...), folder_id: Optional[
                     "folder_id": folder_id if folder_id and folder_id != "null" else None,
                     "question_count": total_questions,
                     "set_count": set_count,
-                    "question_range": question_range
+                    "question_range": question_range,
+                    "content_hash": variants.content_hash
                 }
                 
                 # Check if test with this ID exists (either as primary ID or source_id)
@@ -462,10 +742,12 @@ async def upload_files(files: List[UploadFile] = File(...), folder_id: Optional[
                         "content": json_content,
                         "question_count": total_questions,
                         "set_count": set_count,
-                        "question_range": question_range
+                        "question_range": question_range,
+                        "content_hash": variants.content_hash
                     }
                     
                     client.table("tests").update(update_data).eq("id", existing_test['id']).execute()
+                    content_cache.put(existing_test['id'], variants)
                     results.append({"filename": file.filename, "status": "updated", "id": existing_test['id']})
                 else:
                     # Insert new test
@@ -493,10 +775,11 @@ async def upload_files(files: List[UploadFile] = File(...), folder_id: Optional[
                         del data['id']
                     
                     response = client.table("tests").insert(data).execute()
+                    content_cache.put(response.data[0]['id'], variants)
                     results.append({"filename": file.filename, "status": "created", "id": response.data[0]['id']})
 
-            except json.JSONDecodeError:
-                results.append({"filename": file.filename, "status": "error", "detail": "Invalid JSON"})
+            except BankError as e:
+                results.append({"filename": file.filename, "status": "error", "detail": e.detail, "errors": e.errors})
             except Exception as e:
                 results.append({"filename": file.filename, "status": "error", "detail": str(e)})
         
@@ -511,6 +794,7 @@ async def upload_files(files: List[UploadFile] = File(...), folder_id: Optional[
         else:
             results.append({"filename": file.filename, "status": "error", "detail": "Unsupported file type"})
             
+    invalidate_user_caches(user.id)
     return {"results": results}
 
 # --- Stats ---
@@ -527,10 +811,93 @@ def record_attempt(attempt: TestAttemptCreate, user=Depends(get_current_user), c
         "details": attempt.details
     }
     response = client.table("test_attempts").insert(data).execute()
+    invalidate_user_caches(user.id)
     return response.data[0]
 
+def parse_timestamp(value):
+    # ISO 8601 as sent by the client; without an offset it's taken as UTC
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00").replace("z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.isoformat()
+
+@app.post("/attempts/batch", response_model=TestAttemptBatchResult)
+def record_attempts_batch(batch: TestAttemptBatch, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    if len(batch.attempts) > MAX_BATCH_ATTEMPTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ATTEMPTS} attempts per batch")
+    
+    result = TestAttemptBatchResult()
+    
+    # Validate ids, test ids and timestamps per item (a bad value would fail
+    # the whole insert) and drop repeats within the batch
+    attempts = {}
+    completed = {}
+    for attempt in batch.attempts:
+        try:
+            attempt_id = str(uuid.UUID(attempt.id))
+        except ValueError:
+            result.rejected.append({"id": attempt.id, "detail": "Invalid attempt id"})
+            continue
+        try:
+            uuid.UUID(attempt.test_id)
+        except ValueError:
+            result.rejected.append({"id": attempt_id, "detail": "Invalid test id"})
+            continue
+        completed_at = None
+        if attempt.completed_at is not None:
+            completed_at = parse_timestamp(attempt.completed_at)
+            if completed_at is None:
+                result.rejected.append({"id": attempt_id, "detail": "Invalid completed_at"})
+                continue
+        if attempt_id not in attempts:
+            attempts[attempt_id] = attempt
+            completed[attempt_id] = completed_at
+    
+    # Attempts for tests that no longer exist (deleted while offline) would fail the whole insert
+    test_ids = list(set(a.test_id for a in attempts.values()))
+    known_tests = set()
+    if test_ids:
+        tests_resp = client.table("tests").select("id").in_("id", test_ids).execute()
+        known_tests = set(t['id'] for t in tests_resp.data)
+    
+    # Every row needs the same keys for a bulk insert, so fill completed_at ourselves
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for attempt_id, attempt in attempts.items():
+        if attempt.test_id not in known_tests:
+            result.rejected.append({"id": attempt_id, "detail": "Test not found"})
+            continue
+        row = {
+            "id": attempt_id,
+            "user_id": user.id,
+            "test_id": attempt.test_id,
+            "score": attempt.score,
+            "total_questions": attempt.total_questions,
+            "time_taken": attempt.time_taken,
+            "set_name": attempt.set_name,
+            "details": attempt.details,
+            "completed_at": completed[attempt_id] or now
+        }
+        rows.append(row)
+    
+    if rows:
+        # One statement for the whole batch; ids already stored are skipped (ON CONFLICT DO NOTHING)
+        response = client.table("test_attempts").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+        inserted = set(a['id'] for a in response.data)
+        for row in rows:
+            if row['id'] in inserted:
+                result.inserted.append(row['id'])
+            else:
+                result.duplicates.append(row['id'])
+        invalidate_user_caches(user.id)
+    
+    return result
+
 @app.get("/attempts", response_model=List[TestAttempt])
-def get_attempts(test_id: Optional[str] = None, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+def get_attempts(test_id: Optional[str] = None, include_archived: bool = False, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
     query = client.table("test_attempts").select("*").eq("user_id", user.id)
     if test_id:
         query = query.eq("test_id", test_id)
@@ -538,6 +905,16 @@ def get_attempts(test_id: Optional[str] = None, user=Depends(get_current_user),
     response = query.order("completed_at", desc=True).execute()
     attempts = response.data
     
+    if include_archived:
+        # Compacted reset attempts, shown in history the same way as reset ones
+        archive_query = client.table("test_attempts_archive").select(ARCHIVED_ATTEMPT_COLUMNS).eq("user_id", user.id)
+        if test_id:
+            archive_query = archive_query.eq("test_id", test_id)
+        for a in archive_query.execute().data:
+            a['is_reset'] = True
+            attempts.append(a)
+        attempts.sort(key=lambda a: a['completed_at'], reverse=True)
+    
     if not attempts:
         return []
 
@@ -567,3 +944,17 @@ def get_attempt(attempt_id: str, user=Depends(get_current_user), client=Depends(
         attempt['test_title'] = test_resp.data[0]['title']
     
     return attempt
+
+# --- Export ---
+
+@app.get("/export")
+def export_library(format: str = "ndjson", include_attempts: bool = True, user=Depends(get_current_user), client=Depends(get_authenticated_client)):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(export.FORMATS)}")
+    
+    filename = f"selftest-export-{datetime.now().strftime('%Y%m%d')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "zip":
+        # Members are already deflated; SelectiveGZipMiddleware skips this route
+        return StreamingResponse(export.iter_zip(client, user.id, include_attempts), media_type="application/zip", headers=headers)
+    return StreamingResponse(export.iter_ndjson(client, user.id, include_attempts), media_type="application/x-ndjson", headers=headers)
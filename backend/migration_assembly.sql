@@ -0,0 +1,72 @@
+-- Question index for randomized assembly (POST /folders/{id}/assemble).
+-- One row per question set of every uploaded test, maintained by a trigger on
+-- tests.content, so a folder's question pool can be sampled from a few small
+-- rows instead of downloading the content of every test in it.
+CREATE TABLE IF NOT EXISTS public.question_index (
+  test_id uuid NOT NULL,
+  user_id uuid NOT NULL DEFAULT auth.uid(),
+  set_index integer NOT NULL,
+  set_title text,
+  question_count integer NOT NULL,
+  CONSTRAINT question_index_pkey PRIMARY KEY (test_id, set_index),
+  CONSTRAINT question_index_test_id_fkey FOREIGN KEY (test_id) REFERENCES public.tests (id) ON DELETE CASCADE,
+  CONSTRAINT question_index_user_id_fkey FOREIGN KEY (user_id) REFERENCES auth.users (id)
+);
+
+CREATE INDEX IF NOT EXISTS question_index_user_id_idx ON public.question_index (user_id);
+
+ALTER TABLE public.question_index ENABLE ROW LEVEL SECURITY;
+
+-- Read-only for users; rows are written by the trigger below
+DROP POLICY IF EXISTS "Users can view their own question index" ON public.question_index;
+CREATE POLICY "Users can view their own question index" ON public.question_index FOR SELECT USING (auth.uid() = user_id);
+
+-- How an assembled test was generated (folder, seed, stratify, source of each question).
+-- Null for uploaded tests. Assembled tests are not indexed themselves, so
+-- assembling the same folder again never draws from earlier assemblies.
+ALTER TABLE public.tests ADD COLUMN IF NOT EXISTS assembly jsonb;
+
+
+CREATE OR REPLACE FUNCTION public.index_test_questions() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  DELETE FROM public.question_index WHERE test_id = NEW.id;
+  IF NEW.assembly IS NULL AND jsonb_typeof(NEW.content->'sets') = 'array' THEN
+    INSERT INTO public.question_index (test_id, user_id, set_index, set_title, question_count)
+    SELECT NEW.id, NEW.user_id, (s.ord - 1)::integer, s.value->>'title',
+           CASE WHEN jsonb_typeof(s.value->'questions') = 'array' THEN jsonb_array_length(s.value->'questions') ELSE 0 END
+    FROM jsonb_array_elements(NEW.content->'sets') WITH ORDINALITY AS s(value, ord);
+  END IF;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS tests_index_questions ON public.tests;
+CREATE TRIGGER tests_index_questions
+  AFTER INSERT OR UPDATE OF content ON public.tests
+  FOR EACH ROW EXECUTE FUNCTION public.index_test_questions();
+
+
+-- Returns the picked questions, in the order given, without sending whole
+-- test contents over the wire. picks: [{"test_id", "set_index", "question_index"}, ...]
+-- Runs with the caller's rights, so RLS limits it to the caller's own tests.
+CREATE OR REPLACE FUNCTION public.pick_questions(picks jsonb)
+RETURNS TABLE (test_id uuid, set_index integer, question_index integer, question jsonb)
+LANGUAGE sql STABLE SECURITY INVOKER SET search_path = public AS $$
+  SELECT (p.value->>'test_id')::uuid, (p.value->>'set_index')::integer, (p.value->>'question_index')::integer,
+         t.content->'sets'->((p.value->>'set_index')::integer)->'questions'->((p.value->>'question_index')::integer)
+  FROM jsonb_array_elements(picks) WITH ORDINALITY AS p(value, ord)
+  JOIN public.tests t ON t.id = (p.value->>'test_id')::uuid
+  ORDER BY p.ord;
+$$;
+
+
+-- Backfill for tests uploaded before the index existed
+INSERT INTO public.question_index (test_id, user_id, set_index, set_title, question_count)
+SELECT t.id, t.user_id, (s.ord - 1)::integer, s.value->>'title',
+       CASE WHEN jsonb_typeof(s.value->'questions') = 'array' THEN jsonb_array_length(s.value->'questions') ELSE 0 END
+FROM public.tests t
+CROSS JOIN LATERAL jsonb_array_elements(
+  CASE WHEN jsonb_typeof(t.content->'sets') = 'array' THEN t.content->'sets' ELSE '[]'::jsonb END
+) WITH ORDINALITY AS s(value, ord)
+WHERE t.assembly IS NULL
+ON CONFLICT (test_id, set_index) DO NOTHING;
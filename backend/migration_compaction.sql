@@ -0,0 +1,96 @@
+-- Compaction of soft-reset attempts: reset rows move out of test_attempts into a
+-- compact archive, with one summary row per reset event, so the hot table only
+-- holds live attempts.
+
+-- When the attempt was reset; groups rows into reset events
+ALTER TABLE public.test_attempts ADD COLUMN IF NOT EXISTS reset_at timestamp with time zone;
+
+-- Archived attempts (details are already cleared on reset)
+CREATE TABLE IF NOT EXISTS public.test_attempts_archive (
+  id uuid NOT NULL,
+  test_id uuid NOT NULL,
+  user_id uuid NOT NULL DEFAULT auth.uid(),
+  score integer NOT NULL,
+  total_questions integer NOT NULL,
+  time_taken integer NOT NULL,
+  set_name text,
+  completed_at timestamp with time zone NOT NULL,
+  reset_at timestamp with time zone,
+  archived_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT test_attempts_archive_pkey PRIMARY KEY (id),
+  CONSTRAINT test_attempts_archive_test_id_fkey FOREIGN KEY (test_id) REFERENCES public.tests (id) ON DELETE CASCADE,
+  CONSTRAINT test_attempts_archive_user_id_fkey FOREIGN KEY (user_id) REFERENCES auth.users (id)
+);
+
+CREATE INDEX IF NOT EXISTS test_attempts_archive_user_id_idx ON public.test_attempts_archive (user_id);
+CREATE INDEX IF NOT EXISTS test_attempts_archive_test_id_idx ON public.test_attempts_archive (test_id, completed_at);
+
+-- One row per reset of a test
+CREATE TABLE IF NOT EXISTS public.test_reset_events (
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
+  test_id uuid NOT NULL,
+  user_id uuid NOT NULL DEFAULT auth.uid(),
+  reset_at timestamp with time zone, -- null for attempts reset before reset_at existed
+  attempt_count integer NOT NULL,
+  avg_score integer,
+  best_score integer,
+  total_time_taken bigint NOT NULL,
+  first_completed_at timestamp with time zone,
+  last_completed_at timestamp with time zone,
+  compacted_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT test_reset_events_pkey PRIMARY KEY (id),
+  CONSTRAINT test_reset_events_test_id_fkey FOREIGN KEY (test_id) REFERENCES public.tests (id) ON DELETE CASCADE,
+  CONSTRAINT test_reset_events_user_id_fkey FOREIGN KEY (user_id) REFERENCES auth.users (id)
+);
+
+CREATE INDEX IF NOT EXISTS test_reset_events_user_id_idx ON public.test_reset_events (user_id);
+
+ALTER TABLE public.test_attempts_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.test_reset_events ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view their own archived attempts" ON public.test_attempts_archive;
+CREATE POLICY "Users can view their own archived attempts" ON public.test_attempts_archive FOR SELECT USING (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Users can insert their own archived attempts" ON public.test_attempts_archive;
+CREATE POLICY "Users can insert their own archived attempts" ON public.test_attempts_archive FOR INSERT WITH CHECK (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Users can view their own reset events" ON public.test_reset_events;
+CREATE POLICY "Users can view their own reset events" ON public.test_reset_events FOR SELECT USING (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Users can insert their own reset events" ON public.test_reset_events;
+CREATE POLICY "Users can insert their own reset events" ON public.test_reset_events FOR INSERT WITH CHECK (auth.uid() = user_id);
+
+
+-- Moves reset attempts into the archive in one statement.
+-- Runs with the caller's rights: a signed-in user only sees (and so only moves)
+-- their own rows through RLS; the service role can compact one user or everyone (null).
+CREATE OR REPLACE FUNCTION public.compact_reset_attempts(target_user uuid DEFAULT NULL)
+RETURNS TABLE (rows_archived bigint, reset_events bigint, bytes_removed bigint, bytes_archived bigint)
+LANGUAGE sql SECURITY INVOKER SET search_path = public AS $$
+  WITH moved AS (
+    DELETE FROM public.test_attempts a
+    WHERE a.is_reset
+      AND (target_user IS NULL OR a.user_id = target_user)
+    RETURNING a.*, pg_column_size(a.*) AS row_bytes
+  ),
+  archived AS (
+    INSERT INTO public.test_attempts_archive (id, test_id, user_id, score, total_questions, time_taken, set_name, completed_at, reset_at)
+    SELECT id, test_id, user_id, score, total_questions, time_taken, set_name, completed_at, reset_at FROM moved
+    ON CONFLICT (id) DO NOTHING
+    RETURNING pg_column_size(test_attempts_archive.*) AS row_bytes
+  ),
+  events AS (
+    INSERT INTO public.test_reset_events (test_id, user_id, reset_at, attempt_count, avg_score, best_score, total_time_taken, first_completed_at, last_completed_at)
+    SELECT test_id, user_id, reset_at, count(*),
+           round(avg(score * 100.0 / total_questions) FILTER (WHERE total_questions > 0)),
+           round(max(score * 100.0 / total_questions) FILTER (WHERE total_questions > 0)),
+           sum(time_taken), min(completed_at), max(completed_at)
+    FROM moved
+    GROUP BY test_id, user_id, reset_at
+    RETURNING 1
+  )
+  SELECT (SELECT count(*) FROM moved),
+         (SELECT count(*) FROM events),
+         (SELECT coalesce(sum(row_bytes), 0) FROM moved),
+         (SELECT coalesce(sum(row_bytes), 0) FROM archived);
+$$;
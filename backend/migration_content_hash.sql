@@ -0,0 +1,2 @@
+-- Add content_hash column so cached/compressed test content can be validated without reading content
+ALTER TABLE public.tests ADD COLUMN IF NOT EXISTS content_hash text;
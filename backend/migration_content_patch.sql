@@ -0,0 +1,253 @@
+-- Partial content updates (PATCH /tests/{id}/content): RFC 6902 JSON Patch
+-- applied inside the database with jsonb_set/jsonb_insert, so only the patch
+-- is sent instead of the whole bank.
+
+-- JSON Pointer (RFC 6901) -> jsonb path
+CREATE OR REPLACE FUNCTION public.json_pointer_path(pointer text) RETURNS text[]
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+  IF pointer IS NULL THEN
+    RAISE EXCEPTION 'Missing path';
+  END IF;
+  IF pointer = '' THEN
+    RETURN '{}'::text[];
+  END IF;
+  IF left(pointer, 1) <> '/' THEN
+    RAISE EXCEPTION 'Invalid JSON pointer "%"', pointer;
+  END IF;
+  RETURN ARRAY(
+    SELECT replace(replace(part, '~1', '/'), '~0', '~')
+    FROM unnest(string_to_array(substr(pointer, 2), '/', NULL)) WITH ORDINALITY AS p(part, ord)
+    ORDER BY ord
+  ) || CASE WHEN pointer = '/' THEN ARRAY[''] ELSE '{}'::text[] END;
+END $$;
+
+
+CREATE OR REPLACE FUNCTION public.jsonb_patch_add(doc jsonb, path text[], value jsonb) RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+  n integer := cardinality(path);
+  parent jsonb;
+  idx integer;
+BEGIN
+  IF n = 0 THEN
+    RETURN value;
+  END IF;
+  parent := doc #> path[1:n - 1];
+  IF jsonb_typeof(parent) = 'object' THEN
+    RETURN jsonb_set(doc, path, value, true);
+  ELSIF jsonb_typeof(parent) = 'array' THEN
+    IF path[n] = '-' THEN
+      idx := jsonb_array_length(parent);
+    ELSIF path[n] ~ '^(0|[1-9][0-9]{0,8})$' THEN
+      idx := path[n]::integer;
+    END IF;
+    IF idx IS NULL OR idx > jsonb_array_length(parent) THEN
+      RAISE EXCEPTION 'Array index "%" out of range', path[n];
+    END IF;
+    IF idx = jsonb_array_length(parent) THEN
+      IF n = 1 THEN
+        RETURN doc || jsonb_build_array(value);
+      END IF;
+      RETURN jsonb_set(doc, path[1:n - 1], parent || jsonb_build_array(value));
+    END IF;
+    RETURN jsonb_insert(doc, path[1:n - 1] || idx::text, value);
+  END IF;
+  RAISE EXCEPTION 'Path "/%" does not exist', array_to_string(path[1:n - 1], '/');
+END $$;
+
+
+CREATE OR REPLACE FUNCTION public.jsonb_patch_get(doc jsonb, path text[]) RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+  n integer := cardinality(path);
+  value jsonb;
+BEGIN
+  -- #> ignores a bad array index like "01" or "-"; a pointer must not
+  IF n > 0 AND jsonb_typeof(doc #> path[1:n - 1]) = 'array' AND path[n] !~ '^(0|[1-9][0-9]*)$' THEN
+    value := NULL;
+  ELSE
+    value := doc #> path;
+  END IF;
+  IF value IS NULL THEN
+    RAISE EXCEPTION 'Path "/%" does not exist', array_to_string(path, '/');
+  END IF;
+  RETURN value;
+END $$;
+
+
+-- Applies all operations or raises; ops is the RFC 6902 array
+CREATE OR REPLACE FUNCTION public.jsonb_patch(doc jsonb, ops jsonb) RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+  op jsonb;
+  i integer := 0;
+  path text[];
+  from_path text[];
+  value jsonb;
+BEGIN
+  IF jsonb_typeof(ops) IS DISTINCT FROM 'array' THEN
+    RAISE EXCEPTION 'Patch must be an array of operations';
+  END IF;
+  FOR op IN SELECT * FROM jsonb_array_elements(ops) LOOP
+    path := public.json_pointer_path(op->>'path');
+    CASE op->>'op'
+      WHEN 'add' THEN
+        doc := public.jsonb_patch_add(doc, path, op->'value');
+      WHEN 'remove' THEN
+        PERFORM public.jsonb_patch_get(doc, path);
+        IF cardinality(path) = 0 THEN
+          RAISE EXCEPTION 'Cannot remove the whole document';
+        END IF;
+        doc := doc #- path;
+      WHEN 'replace' THEN
+        PERFORM public.jsonb_patch_get(doc, path);
+        doc := CASE WHEN cardinality(path) = 0 THEN op->'value' ELSE jsonb_set(doc, path, op->'value', false) END;
+      WHEN 'move' THEN
+        from_path := public.json_pointer_path(op->>'from');
+        IF path[1:cardinality(from_path)] = from_path AND cardinality(path) > cardinality(from_path) THEN
+          RAISE EXCEPTION 'Cannot move a value into itself';
+        END IF;
+        value := public.jsonb_patch_get(doc, from_path);
+        doc := public.jsonb_patch_add(doc #- from_path, path, value);
+      WHEN 'copy' THEN
+        value := public.jsonb_patch_get(doc, public.json_pointer_path(op->>'from'));
+        doc := public.jsonb_patch_add(doc, path, value);
+      WHEN 'test' THEN
+        IF public.jsonb_patch_get(doc, path) IS DISTINCT FROM op->'value' THEN
+          RAISE EXCEPTION 'Test failed at "%"', op->>'path';
+        END IF;
+      ELSE
+        RAISE EXCEPTION 'Unknown op "%" in operation %', op->>'op', i;
+    END CASE;
+    i := i + 1;
+  END LOOP;
+  RETURN doc;
+END $$;
+
+
+-- Same rules as bank_schema.Question; null when the question is valid
+CREATE OR REPLACE FUNCTION public.bank_question_error(q jsonb) RETURNS text
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+  IF jsonb_typeof(q) IS DISTINCT FROM 'object' THEN
+    RETURN 'Expected `object`';
+  END IF;
+  IF jsonb_typeof(q->'question') IS DISTINCT FROM 'string' THEN
+    RETURN 'question must be a string';
+  END IF;
+  IF jsonb_typeof(q->'options') IS DISTINCT FROM 'array' THEN
+    RETURN 'options must be a list of strings';
+  END IF;
+  IF EXISTS (SELECT 1 FROM jsonb_array_elements(q->'options') o WHERE jsonb_typeof(o) <> 'string') THEN
+    RETURN 'options must be a list of strings';
+  END IF;
+  IF jsonb_array_length(q->'options') < 2 THEN
+    RETURN 'options must have at least 2 entries';
+  END IF;
+  IF jsonb_typeof(q->'correctAnswer') IS DISTINCT FROM 'string' THEN
+    RETURN 'correctAnswer must be a string';
+  END IF;
+  IF NOT (q->'options') @> jsonb_build_array(q->'correctAnswer') THEN
+    RETURN 'correctAnswer must be one of options';
+  END IF;
+  IF coalesce(jsonb_typeof(q->'passage'), 'null') NOT IN ('string', 'null') THEN
+    RETURN 'passage must be a string';
+  END IF;
+  IF coalesce(jsonb_typeof(q->'explanation'), 'null') NOT IN ('string', 'null') THEN
+    RETURN 'explanation must be a string';
+  END IF;
+  RETURN NULL;
+END $$;
+
+
+-- Patches one test's content. Runs with the caller's rights (RLS applies).
+-- Only the sets the patch touches are re-validated, and the counts are only
+-- recomputed (from set lengths) when questions or sets were added/removed.
+-- content_hash is cleared; get_test re-hashes and re-compresses on next open.
+CREATE OR REPLACE FUNCTION public.patch_test_content(target uuid, ops jsonb)
+RETURNS TABLE (question_count integer, set_count integer, question_range text)
+LANGUAGE plpgsql SECURITY INVOKER SET search_path = public AS $$
+DECLARE
+  doc jsonb;
+  op jsonb;
+  pointer text;
+  p text[];
+  check_all boolean := false;
+  structural boolean := false;
+  touched integer[] := '{}';
+  s record;
+  bad record;
+  min_q integer;
+  max_q integer;
+BEGIN
+  SELECT t.content, t.question_count, t.set_count, t.question_range INTO doc, question_count, set_count, question_range
+  FROM public.tests t WHERE t.id = target FOR UPDATE;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Test not found';
+  END IF;
+
+  doc := public.jsonb_patch(doc, ops);
+  IF jsonb_typeof(doc) IS DISTINCT FROM 'object' OR jsonb_typeof(doc->'sets') IS DISTINCT FROM 'array' THEN
+    RAISE EXCEPTION 'Content must be an object with a sets array';
+  END IF;
+
+  -- Which sets to re-validate, and whether question/set counts can have changed
+  FOR op IN SELECT * FROM jsonb_array_elements(ops) WHERE value->>'op' <> 'test' LOOP
+    FOR pointer IN SELECT x FROM unnest(ARRAY[op->>'path', op->>'from']) x WHERE x IS NOT NULL LOOP
+      p := public.json_pointer_path(pointer);
+      IF cardinality(p) = 0 OR (p[1] = 'sets' AND cardinality(p) <= 2) THEN
+        check_all := true;
+        structural := true;
+      ELSIF p[1] = 'sets' THEN
+        IF p[2] ~ '^[0-9]{1,9}$' THEN
+          touched := touched || p[2]::integer;
+        ELSE
+          check_all := true;
+        END IF;
+        IF cardinality(p) <= 4 AND p[3] = 'questions' THEN
+          structural := true;
+        END IF;
+      END IF;
+    END LOOP;
+  END LOOP;
+
+  FOR s IN
+    SELECT e.value, (e.ord - 1)::integer AS idx
+    FROM jsonb_array_elements(doc->'sets') WITH ORDINALITY AS e(value, ord)
+    WHERE check_all OR (e.ord - 1)::integer = ANY(touched)
+  LOOP
+    IF jsonb_typeof(s.value) IS DISTINCT FROM 'object' OR jsonb_typeof(s.value->'questions') IS DISTINCT FROM 'array' THEN
+      RAISE EXCEPTION 'sets[%] must be an object with a questions array', s.idx;
+    END IF;
+    IF coalesce(jsonb_typeof(s.value->'title'), 'null') NOT IN ('string', 'null') THEN
+      RAISE EXCEPTION 'sets[%].title must be a string', s.idx;
+    END IF;
+    SELECT (q.ord - 1)::integer AS idx, public.bank_question_error(q.value) AS error INTO bad
+    FROM jsonb_array_elements(s.value->'questions') WITH ORDINALITY AS q(value, ord)
+    WHERE public.bank_question_error(q.value) IS NOT NULL
+    ORDER BY q.ord LIMIT 1;
+    IF FOUND THEN
+      RAISE EXCEPTION 'sets[%].questions[%]: %', s.idx, bad.idx, bad.error;
+    END IF;
+  END LOOP;
+
+  IF structural THEN
+    SELECT count(*)::integer, coalesce(sum(n), 0)::integer, min(n), max(n) INTO set_count, question_count, min_q, max_q
+    FROM (SELECT jsonb_array_length(e->'questions') AS n FROM jsonb_array_elements(doc->'sets') e) counts;
+    question_range := CASE
+      WHEN set_count <= 1 THEN NULL
+      WHEN min_q <> max_q THEN min_q || '-' || max_q
+      ELSE min_q::text
+    END;
+  END IF;
+
+  UPDATE public.tests t SET
+    content = doc,
+    question_count = patch_test_content.question_count,
+    set_count = patch_test_content.set_count,
+    question_range = patch_test_content.question_range,
+    content_hash = NULL
+  WHERE t.id = target;
+  RETURN NEXT;
+END $$;
@@ -0,0 +1,59 @@
+-- Folder-wide reads done in the database instead of over PostgREST with a list of
+-- test ids: that list can make the URL too long, and a result over max_rows (1000
+-- by default) is truncated without an error. Needs migration_trends.sql and
+-- migration_assembly.sql. Both run with the caller's rights (RLS applies).
+
+-- Trend points for one test, or for a folder and its subfolders (assembled
+-- practice tests left out): rollups merged per day or week, then merged into at
+-- most `points` contiguous groups, so at most `points` rows come back.
+CREATE OR REPLACE FUNCTION public.score_trend(folder uuid DEFAULT NULL, test uuid DEFAULT NULL, bucket text DEFAULT 'day', points integer DEFAULT 60)
+RETURNS TABLE (start_day date, end_day date, attempt_count bigint, score_sum double precision, time_sum bigint)
+LANGUAGE sql STABLE SECURITY INVOKER SET search_path = public AS $$
+  WITH RECURSIVE subtree AS (
+    SELECT f.id FROM public.folders f WHERE f.id = folder
+    UNION ALL
+    SELECT f.id FROM public.folders f JOIN subtree s ON f.parent_id = s.id
+  ),
+  picked AS (
+    SELECT t.id FROM public.tests t WHERE t.id = test
+    UNION
+    SELECT t.id FROM public.tests t JOIN subtree s ON t.folder_id = s.id WHERE t.assembly IS NULL
+  ),
+  per_bucket AS (
+    SELECT CASE WHEN bucket = 'week' THEN date_trunc('week', b.day)::date ELSE b.day END AS start_day,
+           sum(b.attempt_count) AS cnt, sum(b.score_sum) AS pct, sum(b.time_sum) AS secs
+    FROM public.test_score_buckets b JOIN picked p ON p.id = b.test_id
+    GROUP BY 1
+  ),
+  numbered AS (
+    SELECT per_bucket.*, row_number() OVER (ORDER BY per_bucket.start_day) - 1 AS rn, count(*) OVER () AS n
+    FROM per_bucket
+  )
+  -- Same grouping as series[i * n // points:(i + 1) * n // points]
+  SELECT min(start_day), max(start_day) + CASE WHEN bucket = 'week' THEN 6 ELSE 0 END,
+         sum(cnt)::bigint, sum(pct)::double precision, sum(secs)::bigint
+  FROM numbered
+  GROUP BY CASE WHEN n > points THEN ((rn + 1) * points - 1) / n ELSE rn END
+  ORDER BY 1;
+$$;
+
+
+-- Question index rows (one per set) of every bank in a folder and its
+-- subfolders, for /folders/{id}/assemble. One jsonb value, so max_rows doesn't
+-- apply; null when the folder doesn't exist or isn't the caller's.
+CREATE OR REPLACE FUNCTION public.folder_question_index(folder uuid)
+RETURNS jsonb
+LANGUAGE sql STABLE SECURITY INVOKER SET search_path = public AS $$
+  WITH RECURSIVE subtree AS (
+    SELECT f.id FROM public.folders f WHERE f.id = folder
+    UNION ALL
+    SELECT f.id FROM public.folders f JOIN subtree s ON f.parent_id = s.id
+  )
+  SELECT CASE WHEN EXISTS (SELECT 1 FROM subtree) THEN coalesce((
+    SELECT jsonb_agg(jsonb_build_object('test_id', q.test_id, 'set_index', q.set_index, 'question_count', q.question_count))
+    FROM public.question_index q
+    JOIN public.tests t ON t.id = q.test_id
+    JOIN subtree s ON t.folder_id = s.id
+    WHERE t.assembly IS NULL
+  ), '[]'::jsonb) END;
+$$;
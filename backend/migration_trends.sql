@@ -0,0 +1,131 @@
+-- Per-day score/time rollups of live (non-reset) attempts, used by the trend endpoints.
+-- Kept up to date by statement-level triggers on test_attempts, so a batch insert
+-- touches each (test, day) rollup once instead of once per attempt.
+-- Keyed by user as well: test_attempts.test_id is only checked by its foreign key,
+-- which bypasses RLS, so another user's attempt on a test must not share (or
+-- claim) the owner's rollup row.
+CREATE TABLE IF NOT EXISTS public.test_score_buckets (
+  test_id uuid NOT NULL,
+  user_id uuid NOT NULL DEFAULT auth.uid(),
+  day date NOT NULL,
+  attempt_count integer NOT NULL DEFAULT 0,
+  score_sum double precision NOT NULL DEFAULT 0, -- sum of percentage scores
+  time_sum bigint NOT NULL DEFAULT 0, -- sum of time_taken, in seconds
+  CONSTRAINT test_score_buckets_pkey PRIMARY KEY (user_id, test_id, day),
+  CONSTRAINT test_score_buckets_test_id_fkey FOREIGN KEY (test_id) REFERENCES public.tests (id) ON DELETE CASCADE,
+  CONSTRAINT test_score_buckets_user_id_fkey FOREIGN KEY (user_id) REFERENCES auth.users (id)
+);
+
+-- Databases created with the earlier (test_id, day) key; the rollups are rebuilt below
+ALTER TABLE public.test_score_buckets DROP CONSTRAINT IF EXISTS test_score_buckets_pkey;
+ALTER TABLE public.test_score_buckets ADD CONSTRAINT test_score_buckets_pkey PRIMARY KEY (user_id, test_id, day);
+-- The primary key covers lookups by user
+DROP INDEX IF EXISTS public.test_score_buckets_user_id_idx;
+
+ALTER TABLE public.test_score_buckets ENABLE ROW LEVEL SECURITY;
+
+-- Read-only for users; rows are written by the triggers below
+DROP POLICY IF EXISTS "Users can view their own score buckets" ON public.test_score_buckets;
+CREATE POLICY "Users can view their own score buckets" ON public.test_score_buckets FOR SELECT USING (auth.uid() = user_id);
+
+
+CREATE OR REPLACE FUNCTION public.rollup_attempts_insert() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  INSERT INTO public.test_score_buckets AS b (test_id, user_id, day, attempt_count, score_sum, time_sum)
+  SELECT test_id, user_id, (completed_at AT TIME ZONE 'utc')::date, count(*),
+         sum(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END),
+         sum(time_taken)
+  FROM new_rows
+  WHERE NOT is_reset
+  GROUP BY test_id, user_id, (completed_at AT TIME ZONE 'utc')::date
+  ON CONFLICT (user_id, test_id, day) DO UPDATE SET
+    attempt_count = b.attempt_count + excluded.attempt_count,
+    score_sum = b.score_sum + excluded.score_sum,
+    time_sum = b.time_sum + excluded.time_sum;
+  RETURN NULL;
+END $$;
+
+-- Handles resets (is_reset flipped to true) as well as edited scores/times
+CREATE OR REPLACE FUNCTION public.rollup_attempts_update() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  WITH delta AS (
+    SELECT test_id, user_id, day, sum(cnt) AS cnt, sum(pct) AS pct, sum(secs) AS secs
+    FROM (
+      SELECT test_id, user_id, (completed_at AT TIME ZONE 'utc')::date AS day, -1 AS cnt,
+             -(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END) AS pct,
+             -time_taken AS secs
+      FROM old_rows WHERE NOT is_reset
+      UNION ALL
+      SELECT test_id, user_id, (completed_at AT TIME ZONE 'utc')::date, 1,
+             CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END,
+             time_taken
+      FROM new_rows WHERE NOT is_reset
+    ) changes
+    GROUP BY test_id, user_id, day
+  )
+  INSERT INTO public.test_score_buckets AS b (test_id, user_id, day, attempt_count, score_sum, time_sum)
+  SELECT test_id, user_id, day, cnt, pct, secs FROM delta
+  WHERE cnt <> 0 OR pct <> 0 OR secs <> 0
+  ON CONFLICT (user_id, test_id, day) DO UPDATE SET
+    attempt_count = b.attempt_count + excluded.attempt_count,
+    score_sum = b.score_sum + excluded.score_sum,
+    time_sum = b.time_sum + excluded.time_sum;
+
+  DELETE FROM public.test_score_buckets b
+  USING (SELECT test_id, user_id FROM old_rows UNION SELECT test_id, user_id FROM new_rows) t
+  WHERE b.user_id = t.user_id AND b.test_id = t.test_id AND b.attempt_count <= 0;
+  RETURN NULL;
+END $$;
+
+-- Only updates existing rollups: when a test is deleted its rollups are already gone
+CREATE OR REPLACE FUNCTION public.rollup_attempts_delete() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  UPDATE public.test_score_buckets b SET
+    attempt_count = b.attempt_count - d.cnt,
+    score_sum = b.score_sum - d.pct,
+    time_sum = b.time_sum - d.secs
+  FROM (
+    SELECT test_id, user_id, (completed_at AT TIME ZONE 'utc')::date AS day, count(*) AS cnt,
+           sum(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END) AS pct,
+           sum(time_taken) AS secs
+    FROM old_rows WHERE NOT is_reset
+    GROUP BY test_id, user_id, (completed_at AT TIME ZONE 'utc')::date
+  ) d
+  WHERE b.user_id = d.user_id AND b.test_id = d.test_id AND b.day = d.day;
+
+  DELETE FROM public.test_score_buckets b
+  USING (SELECT DISTINCT test_id, user_id FROM old_rows) t
+  WHERE b.user_id = t.user_id AND b.test_id = t.test_id AND b.attempt_count <= 0;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS test_attempts_rollup_insert ON public.test_attempts;
+CREATE TRIGGER test_attempts_rollup_insert AFTER INSERT ON public.test_attempts
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.rollup_attempts_insert();
+
+DROP TRIGGER IF EXISTS test_attempts_rollup_update ON public.test_attempts;
+CREATE TRIGGER test_attempts_rollup_update AFTER UPDATE ON public.test_attempts
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.rollup_attempts_update();
+
+DROP TRIGGER IF EXISTS test_attempts_rollup_delete ON public.test_attempts;
+CREATE TRIGGER test_attempts_rollup_delete AFTER DELETE ON public.test_attempts
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.rollup_attempts_delete();
+
+
+-- Backfill from existing attempts. Rebuilds from scratch, so it is also safe to
+-- re-run (e.g. after the key change above); the lock keeps attempts recorded
+-- meanwhile from being counted twice.
+BEGIN;
+LOCK TABLE public.test_attempts IN SHARE ROW EXCLUSIVE MODE;
+DELETE FROM public.test_score_buckets;
+INSERT INTO public.test_score_buckets (test_id, user_id, day, attempt_count, score_sum, time_sum)
+SELECT test_id, user_id, (completed_at AT TIME ZONE 'utc')::date, count(*),
+       sum(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END),
+       sum(time_taken)
+FROM public.test_attempts
+WHERE NOT is_reset
+GROUP BY test_id, user_id, (completed_at AT TIME ZONE 'utc')::date;
+COMMIT;
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Cache shared by all uvicorn workers of one container: a SQLite file in WAL
+# mode, so derived data (compressed test content, per-user stats) built by one
+# worker is a hit for the others and a write in any worker invalidates it for
+# all of them. Enabled by setting SHARED_CACHE_PATH; otherwise every call is a
+# miss and workers only use their in-process caches.
+#
+# Only invalidates within the container. With several Cloud Run instances,
+# entries written elsewhere are bounded by their TTL.
+#
+# Entries derived from data a write can change (stats) are guarded by a
+# per-key generation: read generation() before querying, bump() after the
+# write commits, and set(..., generation=g) is skipped if a bump happened in
+# between, so a reader can't store what it read before the write.
+
+CACHE_PATH = os.environ.get("SHARED_CACHE_PATH")
+MAX_ENTRIES = {"content": 512, "stats": 5000}  # per namespace, oldest evicted first
+GENERATION_TTL = 3600  # generations untouched this long are dropped (no read runs that long)
+
+
+class SharedCache:
+    enabled = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)"
+            ") WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_created_at ON entries (namespace, created_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " generation INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)"
+            ") WITHOUT ROWID"
+        )
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def generation(self, namespace, key):
+        try:
+            row = self._conn().execute(
+                "SELECT generation FROM generations WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else 0
+
+    def set(self, namespace, key, value, ttl=None, generation=0):
+        # generation=None (from a failed generation() read) never stores
+        if generation is None:
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            # One statement, so the generation check and the write are atomic
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, created_at)"
+                " SELECT ?, ?, ?, ?, ?"
+                " WHERE coalesce((SELECT generation FROM generations WHERE namespace = ? AND key = ?), 0) = ?",
+                (namespace, key, value, now + ttl if ttl else None, now, namespace, key, generation),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(conn, now)
+        except sqlite3.Error:
+            # A busy or broken cache must never fail the request
+            pass
+
+    def delete(self, namespace, key):
+        try:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error:
+            pass
+
+    def bump(self, namespace, key):
+        # Invalidate the entry and any read of it still in progress
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO generations (namespace, key, generation, updated_at) VALUES (?, ?, 1, ?)"
+                    " ON CONFLICT (namespace, key) DO UPDATE SET generation = generation + 1, updated_at = excluded.updated_at",
+                    (namespace, key, time.time()),
+                )
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def _prune(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        conn.execute("DELETE FROM generations WHERE updated_at < ?", (now - GENERATION_TTL,))
+        for namespace, limit in MAX_ENTRIES.items():
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key NOT IN ("
+                " SELECT key FROM entries WHERE namespace = ? ORDER BY created_at DESC LIMIT ?)",
+                (namespace, namespace, limit),
+            )
+
+    def stats(self):
+        return {"enabled": True, "hits": self.hits, "misses": self.misses}
+
+
+class _Disabled:
+    enabled = False
+
+    def get(self, namespace, key):
+        return None
+
+    def generation(self, namespace, key):
+        return None
+
+    def set(self, namespace, key, value, ttl=None, generation=0):
+        pass
+
+    def delete(self, namespace, key):
+        pass
+
+    def bump(self, namespace, key):
+        pass
+
+    def stats(self):
+        return {"enabled": False}
+
+
+cache = SharedCache(CACHE_PATH) if CACHE_PATH else _Disabled()
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+
+# Coalesces identical upstream queries: while a query for a key is in flight,
+# other callers with the same key wait for it and share its result instead of
+# issuing their own. Keys always start with the user id since RLS makes the
+# same query return different rows per user.
+#
+# Optionally keeps results for SINGLEFLIGHT_CACHE_TTL seconds (default 0, off).
+# forget() bumps the user's generation, which is part of the flight key, so a
+# call started before a write is neither joined nor cached after it.
+# Shared results are the same objects for every caller; treat them as read-only.
+# Expired entries and the generations of idle users are swept periodically, and
+# the cache holds at most MAX_CACHE_ENTRIES results (oldest dropped first).
+
+CACHE_TTL = float(os.environ.get("SINGLEFLIGHT_CACHE_TTL", "0"))
+MAX_CACHE_ENTRIES = 1000
+SWEEP_INTERVAL = 30  # seconds
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, cache_ttl: float = 0.0):
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call in flight
+        self._cache = {}  # key -> (expires_at, result)
+        self._generations = {}  # user id -> times forget() was called
+        self._next_sweep = 0.0
+        self.requested = 0
+        self.executed = 0
+        self.shared = 0  # waited on an in-flight call
+        self.cache_hits = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            self.requested += 1
+            generation = self._generations.get(key[0], 0)
+            flight_key = (generation,) + tuple(key)
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self.cache_hits += 1
+                    return cached[1]
+                del self._cache[key]
+            call = self._calls.get(flight_key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[flight_key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[flight_key]
+                # Rows read before a write the user made meanwhile aren't kept
+                current = self._generations.get(key[0], 0) == generation
+                if call.error is None and self.cache_ttl > 0 and current:
+                    now = time.monotonic()
+                    self._sweep(now)
+                    self._cache.pop(key, None)
+                    while len(self._cache) >= MAX_CACHE_ENTRIES:
+                        del self._cache[next(iter(self._cache))]
+                    self._cache[key] = (now + self.cache_ttl, call.result)
+            call.done.set()
+        return call.result
+
+    def forget(self, user_id):
+        # Drop cached results for a user after they write something; calls
+        # already in flight finish for their current waiters only
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [k for k in self._cache if k[0] == user_id]:
+                del self._cache[key]
+            self._sweep(time.monotonic())
+
+    def _sweep(self, now):
+        # Called with the lock held
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        for key in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[key]
+        # A generation only matters while a call that read it is in flight;
+        # dropping it (back to 0) can't make such a call look current
+        busy = {flight_key[1] for flight_key in self._calls}
+        for user_id in [u for u in self._generations if u not in busy]:
+            del self._generations[user_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requested": self.requested,
+                "executed": self.executed,
+                "shared_in_flight": self.shared,
+                "cache_hits": self.cache_hits,
+                "saved": self.shared + self.cache_hits,
+                "cache_ttl": self.cache_ttl,
+            }
+
+
+flights = SingleFlight(CACHE_TTL)
@@ -0,0 +1,830 @@
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import msgspec
+
+from bank_schema import QuestionSet, question_stats
+import trends
+
+# Embedded storage backend for single-node deployments (DATA_BACKEND=sqlite).
+#
+# SqliteClient speaks the subset of the Supabase client that the endpoints use
+# (table(...).select/insert/update/upsert/delete with eq/in_/gt/order/limit,
+# rpc(...), storage.from_(...).upload), so main.py runs unchanged on either
+# backend. A client is bound to one user and every statement is scoped to
+# that user's rows, which stands in for the RLS policies of the Supabase
+# schema. The rollup and question index triggers and the RPC functions from
+# the migration_*.sql files are reimplemented here.
+
+DB_PATH = os.environ.get("SQLITE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "selftest.sqlite3")
+STORAGE_DIR = os.environ.get("LOCAL_STORAGE_DIR") or os.path.join(os.path.dirname(DB_PATH), "storage")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+  id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  name TEXT NOT NULL,
+  parent_id TEXT REFERENCES folders (id) ON DELETE CASCADE,
+  created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS folders_user_id_idx ON folders (user_id);
+CREATE INDEX IF NOT EXISTS folders_parent_id_idx ON folders (parent_id);
+
+CREATE TABLE IF NOT EXISTS tests (
+  id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  title TEXT NOT NULL,
+  content TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  folder_id TEXT REFERENCES folders (id) ON DELETE CASCADE,
+  is_starred INTEGER NOT NULL DEFAULT 0,
+  last_accessed TEXT,
+  question_count INTEGER DEFAULT 0,
+  set_count INTEGER DEFAULT 0,
+  question_range TEXT,
+  source_id TEXT,
+  content_hash TEXT,
+  assembly TEXT
+);
+CREATE INDEX IF NOT EXISTS tests_user_id_idx ON tests (user_id, source_id);
+CREATE INDEX IF NOT EXISTS tests_folder_id_idx ON tests (folder_id);
+
+CREATE TABLE IF NOT EXISTS test_attempts (
+  id TEXT PRIMARY KEY,
+  test_id TEXT NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+  user_id TEXT NOT NULL,
+  score INTEGER NOT NULL,
+  total_questions INTEGER NOT NULL,
+  time_taken INTEGER NOT NULL,
+  completed_at TEXT NOT NULL,
+  is_reset INTEGER NOT NULL DEFAULT 0,
+  details TEXT,
+  set_name TEXT,
+  reset_at TEXT
+);
+CREATE INDEX IF NOT EXISTS test_attempts_user_id_idx ON test_attempts (user_id);
+CREATE INDEX IF NOT EXISTS test_attempts_test_id_idx ON test_attempts (test_id, completed_at);
+
+CREATE TABLE IF NOT EXISTS test_attempts_archive (
+  id TEXT PRIMARY KEY,
+  test_id TEXT NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+  user_id TEXT NOT NULL,
+  score INTEGER NOT NULL,
+  total_questions INTEGER NOT NULL,
+  time_taken INTEGER NOT NULL,
+  set_name TEXT,
+  completed_at TEXT NOT NULL,
+  reset_at TEXT,
+  archived_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS test_attempts_archive_user_id_idx ON test_attempts_archive (user_id);
+CREATE INDEX IF NOT EXISTS test_attempts_archive_test_id_idx ON test_attempts_archive (test_id, completed_at);
+
+CREATE TABLE IF NOT EXISTS test_reset_events (
+  id TEXT PRIMARY KEY,
+  test_id TEXT NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+  user_id TEXT NOT NULL,
+  reset_at TEXT,
+  attempt_count INTEGER NOT NULL,
+  avg_score INTEGER,
+  best_score INTEGER,
+  total_time_taken INTEGER NOT NULL,
+  first_completed_at TEXT,
+  last_completed_at TEXT,
+  compacted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS test_reset_events_user_id_idx ON test_reset_events (user_id);
+
+CREATE TABLE IF NOT EXISTS test_score_buckets (
+  test_id TEXT NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+  user_id TEXT NOT NULL,
+  day TEXT NOT NULL,
+  attempt_count INTEGER NOT NULL DEFAULT 0,
+  score_sum REAL NOT NULL DEFAULT 0,
+  time_sum INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, test_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS question_index (
+  test_id TEXT NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+  user_id TEXT NOT NULL,
+  set_index INTEGER NOT NULL,
+  set_title TEXT,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (test_id, set_index)
+);
+CREATE INDEX IF NOT EXISTS question_index_user_id_idx ON question_index (user_id);
+
+-- Per-row versions of the triggers in migration_trends.sql (completed_at is stored in UTC)
+CREATE TRIGGER IF NOT EXISTS rollup_attempts_insert AFTER INSERT ON test_attempts WHEN NOT NEW.is_reset BEGIN
+  INSERT INTO test_score_buckets (test_id, user_id, day, attempt_count, score_sum, time_sum)
+  SELECT NEW.test_id, NEW.user_id, substr(NEW.completed_at, 1, 10), 1,
+         CASE WHEN NEW.total_questions > 0 THEN NEW.score * 100.0 / NEW.total_questions ELSE 0 END, NEW.time_taken
+  WHERE true
+  ON CONFLICT (user_id, test_id, day) DO UPDATE SET
+    attempt_count = attempt_count + 1,
+    score_sum = score_sum + excluded.score_sum,
+    time_sum = time_sum + excluded.time_sum;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollup_attempts_update
+AFTER UPDATE OF test_id, score, total_questions, time_taken, completed_at, is_reset ON test_attempts BEGIN
+  UPDATE test_score_buckets SET
+    attempt_count = attempt_count - 1,
+    score_sum = score_sum - CASE WHEN OLD.total_questions > 0 THEN OLD.score * 100.0 / OLD.total_questions ELSE 0 END,
+    time_sum = time_sum - OLD.time_taken
+  WHERE NOT OLD.is_reset AND user_id = OLD.user_id AND test_id = OLD.test_id AND day = substr(OLD.completed_at, 1, 10);
+  INSERT INTO test_score_buckets (test_id, user_id, day, attempt_count, score_sum, time_sum)
+  SELECT NEW.test_id, NEW.user_id, substr(NEW.completed_at, 1, 10), 1,
+         CASE WHEN NEW.total_questions > 0 THEN NEW.score * 100.0 / NEW.total_questions ELSE 0 END, NEW.time_taken
+  WHERE NOT NEW.is_reset
+  ON CONFLICT (user_id, test_id, day) DO UPDATE SET
+    attempt_count = attempt_count + 1,
+    score_sum = score_sum + excluded.score_sum,
+    time_sum = time_sum + excluded.time_sum;
+  DELETE FROM test_score_buckets WHERE user_id IN (OLD.user_id, NEW.user_id) AND test_id IN (OLD.test_id, NEW.test_id) AND attempt_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollup_attempts_delete AFTER DELETE ON test_attempts WHEN NOT OLD.is_reset BEGIN
+  UPDATE test_score_buckets SET
+    attempt_count = attempt_count - 1,
+    score_sum = score_sum - CASE WHEN OLD.total_questions > 0 THEN OLD.score * 100.0 / OLD.total_questions ELSE 0 END,
+    time_sum = time_sum - OLD.time_taken
+  WHERE user_id = OLD.user_id AND test_id = OLD.test_id AND day = substr(OLD.completed_at, 1, 10);
+  DELETE FROM test_score_buckets WHERE user_id = OLD.user_id AND test_id = OLD.test_id AND attempt_count <= 0;
+END;
+
+-- Same as index_test_questions in migration_assembly.sql
+CREATE TRIGGER IF NOT EXISTS tests_index_questions_insert AFTER INSERT ON tests BEGIN
+  INSERT INTO question_index (test_id, user_id, set_index, set_title, question_count)
+  SELECT NEW.id, NEW.user_id, CAST(s.key AS INTEGER), json_extract(s.value, '$.title'),
+         CASE json_type(s.value, '$.questions') WHEN 'array' THEN json_array_length(s.value, '$.questions') ELSE 0 END
+  FROM json_each(NEW.content, '$.sets') AS s
+  WHERE NEW.assembly IS NULL AND json_type(NEW.content, '$.sets') = 'array';
+END;
+
+CREATE TRIGGER IF NOT EXISTS tests_index_questions_update AFTER UPDATE OF content, assembly ON tests BEGIN
+  DELETE FROM question_index WHERE test_id = NEW.id;
+  INSERT INTO question_index (test_id, user_id, set_index, set_title, question_count)
+  SELECT NEW.id, NEW.user_id, CAST(s.key AS INTEGER), json_extract(s.value, '$.title'),
+         CASE json_type(s.value, '$.questions') WHEN 'array' THEN json_array_length(s.value, '$.questions') ELSE 0 END
+  FROM json_each(NEW.content, '$.sets') AS s
+  WHERE NEW.assembly IS NULL AND json_type(NEW.content, '$.sets') = 'array';
+END;
+"""
+
+# Databases created when test_score_buckets was keyed by (test_id, day): drop
+# the table and its triggers, let SCHEMA recreate them, then rebuild the rollups
+SCORE_BUCKETS_UPGRADE = """
+DROP TRIGGER IF EXISTS rollup_attempts_insert;
+DROP TRIGGER IF EXISTS rollup_attempts_update;
+DROP TRIGGER IF EXISTS rollup_attempts_delete;
+DROP TABLE IF EXISTS test_score_buckets;
+"""
+
+SCORE_BUCKETS_REBUILD = """
+INSERT INTO test_score_buckets (test_id, user_id, day, attempt_count, score_sum, time_sum)
+SELECT test_id, user_id, substr(completed_at, 1, 10), count(*),
+       sum(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END), sum(time_taken)
+FROM test_attempts
+WHERE NOT is_reset
+GROUP BY test_id, user_id, substr(completed_at, 1, 10);
+"""
+
+JSON_COLUMNS = {"content", "assembly", "details"}
+BOOL_COLUMNS = {"is_starred", "is_reset"}
+TIMESTAMP_COLUMNS = {
+    "created_at", "completed_at", "last_accessed", "reset_at", "archived_at",
+    "compacted_at", "first_completed_at", "last_completed_at",
+}
+# Filled in on insert when missing, like the column defaults in Postgres
+DEFAULT_NOW = {
+    "folders": "created_at",
+    "tests": "created_at",
+    "test_attempts": "completed_at",
+    "test_attempts_archive": "archived_at",
+    "test_reset_events": "compacted_at",
+}
+
+_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_]*\Z")
+_INDEX = re.compile(r"(0|[1-9][0-9]*)\Z")
+
+
+class APIError(Exception):
+    # Same shape as postgrest's APIError, which the endpoints read .message from
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _timestamp(value):
+    # Stored as UTC ISO strings so they sort and bucket by day like timestamptz
+    if not isinstance(value, str):
+        return value
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise APIError(f'invalid input syntax for type timestamp with time zone: "{value}"') from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _to_db(column, value):
+    if value is None:
+        return None
+    if column in JSON_COLUMNS:
+        return json.dumps(value)
+    if column in TIMESTAMP_COLUMNS:
+        return _timestamp(value)
+    return value
+
+
+def _from_db(row):
+    data = dict(row)
+    for column, value in data.items():
+        if value is None:
+            continue
+        if column in JSON_COLUMNS:
+            data[column] = json.loads(value)
+        elif column in BOOL_COLUMNS:
+            data[column] = bool(value)
+    return data
+
+
+class Database:
+    def __init__(self, path=DB_PATH, storage_dir=STORAGE_DIR):
+        self.path = path
+        self.storage_dir = storage_dir
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self.conn()
+        key = [c[1] for c in sorted(conn.execute("PRAGMA table_info(test_score_buckets)"), key=lambda c: c[5]) if c[5]]
+        if key and key != ["user_id", "test_id", "day"]:
+            conn.executescript("BEGIN IMMEDIATE;" + SCORE_BUCKETS_UPGRADE + SCHEMA + SCORE_BUCKETS_REBUILD + "COMMIT;")
+        else:
+            conn.executescript("BEGIN IMMEDIATE;" + SCHEMA + "COMMIT;")
+        self.columns = {}
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            self.columns[table] = [c[1] for c in conn.execute(f"PRAGMA table_info({table})")]
+
+    def conn(self):
+        # One connection per thread, in autocommit mode; writes use transaction()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def client(self, user_id):
+        return SqliteClient(self, user_id)
+
+
+@contextmanager
+def transaction(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so a read-then-write never
+    # fails halfway with SQLITE_BUSY when another worker is writing
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+_database = None
+_database_lock = threading.Lock()
+
+def get_database():
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = Database()
+    return _database
+
+
+class SqliteClient:
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = str(user_id)
+        self.storage = LocalStorage(db.storage_dir, self.user_id)
+
+    def table(self, table_name):
+        if table_name not in self.db.columns:
+            raise APIError(f'relation "public.{table_name}" does not exist')
+        return Query(self, table_name)
+
+    def rpc(self, fn, params=None):
+        handler = _RPCS.get(fn)
+        if handler is None:
+            raise APIError(f"Could not find the function public.{fn}")
+        return _Call(lambda: handler(self, **(params or {})))
+
+
+class _Call:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return Result(self.fn())
+
+
+class Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.filters = []
+        self.params = []
+        self.order_by = []
+        self.limit_count = None
+        self.offset = None
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+
+    def _column(self, name):
+        name = name.strip()
+        if not _IDENTIFIER.match(name) or name not in self.client.db.columns[self.table]:
+            raise APIError(f"column {self.table}.{name} does not exist")
+        return name
+
+    # --- actions ---
+
+    def select(self, columns="*"):
+        self.action = "select"
+        self.columns = "*" if columns.strip() == "*" else ", ".join(self._column(c) for c in columns.split(","))
+        return self
+
+    def insert(self, data):
+        self.action = "insert"
+        self.payload = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict="id", ignore_duplicates=False):
+        self.action = "upsert"
+        self.payload = data if isinstance(data, list) else [data]
+        self.on_conflict = [self._column(c) for c in on_conflict.split(",")]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data):
+        self.action = "update"
+        self.payload = data
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # --- filters ---
+
+    def _filter(self, column, op, value):
+        column = self._column(column)
+        self.filters.append(f"{column} {op} ?")
+        self.params.append(_to_db(column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "<>", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def in_(self, column, values):
+        column = self._column(column)
+        values = list(values)
+        self.filters.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+        self.params.extend(_to_db(column, v) for v in values)
+        return self
+
+    def is_(self, column, value):
+        column = self._column(column)
+        self.filters.append(f"{column} IS NULL" if value in (None, "null") else f"{column} IS NOT NULL")
+        return self
+
+    # --- modifiers ---
+
+    def order(self, column, desc=False):
+        # Postgres puts NULLs last when ascending and first when descending
+        self.order_by.append(f"{self._column(column)} {'DESC NULLS FIRST' if desc else 'ASC NULLS LAST'}")
+        return self
+
+    def limit(self, count):
+        self.limit_count = int(count)
+        return self
+
+    def range(self, start, end):
+        self.offset = int(start)
+        self.limit_count = int(end) - int(start) + 1
+        return self
+
+    # --- execution ---
+
+    def _where(self):
+        # Every statement only sees the client's own rows
+        return " AND ".join(["user_id = ?"] + self.filters), [self.client.user_id] + self.params
+
+    def _row(self, data):
+        row = {}
+        for column, value in data.items():
+            column = self._column(column)
+            if column == "user_id" and value is not None and str(value) != self.client.user_id:
+                raise APIError(f'new row violates row-level security policy for table "{self.table}"')
+            row[column] = _to_db(column, value)
+        row["user_id"] = self.client.user_id
+        return row
+
+    def _new_row(self, data):
+        row = self._row(data)
+        columns = self.client.db.columns[self.table]
+        if "id" in columns and row.get("id") is None:
+            row["id"] = str(uuid.uuid4())
+        now_column = DEFAULT_NOW.get(self.table)
+        if now_column and row.get(now_column) is None:
+            row[now_column] = _now()
+        return row
+
+    def execute(self):
+        conn = self.client.db.conn()
+        try:
+            if self.action == "select":
+                return Result(self._select(conn))
+            with transaction(conn):
+                return Result(getattr(self, "_" + self.action)(conn))
+        except sqlite3.IntegrityError as e:
+            raise APIError(str(e)) from None
+
+    def _select(self, conn):
+        where, params = self._where()
+        sql = f"SELECT {self.columns} FROM {self.table} WHERE {where}"
+        if self.order_by:
+            sql += " ORDER BY " + ", ".join(self.order_by)
+        if self.limit_count is not None or self.offset is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [self.limit_count if self.limit_count is not None else -1, self.offset or 0]
+        return [_from_db(r) for r in conn.execute(sql, params).fetchall()]
+
+    def _insert(self, conn):
+        out = []
+        for data in self.payload:
+            row = self._new_row(data)
+            sql = f"INSERT INTO {self.table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))}) RETURNING *"
+            out.extend(_from_db(r) for r in conn.execute(sql, list(row.values())).fetchall())
+        return out
+
+    def _upsert(self, conn):
+        out = []
+        for data in self.payload:
+            row = self._new_row(data)
+            sql = f"INSERT INTO {self.table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))}) ON CONFLICT ({', '.join(self.on_conflict)}) "
+            if self.ignore_duplicates:
+                sql += "DO NOTHING"
+            else:
+                updates = ", ".join(f"{c} = excluded.{c}" for c in row if c not in self.on_conflict)
+                # Never overwrite another user's row
+                sql += f"DO UPDATE SET {updates} WHERE {self.table}.user_id = excluded.user_id"
+            out.extend(_from_db(r) for r in conn.execute(sql + " RETURNING *", list(row.values())).fetchall())
+        return out
+
+    def _update(self, conn):
+        row = self._row(self.payload)
+        del row["user_id"]
+        if not row:
+            return []
+        where, params = self._where()
+        sql = f"UPDATE {self.table} SET {', '.join(f'{c} = ?' for c in row)} WHERE {where} RETURNING *"
+        return [_from_db(r) for r in conn.execute(sql, list(row.values()) + params).fetchall()]
+
+    def _delete(self, conn):
+        where, params = self._where()
+        return [_from_db(r) for r in conn.execute(f"DELETE FROM {self.table} WHERE {where} RETURNING *", params).fetchall()]
+
+
+class LocalStorage:
+    # client.storage.from_(bucket).upload(path, data, options) on the local disk;
+    # like the storage policies, a user can only write under their own id
+    def __init__(self, root, user_id):
+        self.root = root
+        self.user_id = user_id
+
+    def from_(self, bucket):
+        return _Bucket(os.path.join(self.root, bucket), self.user_id)
+
+
+class _Bucket:
+    def __init__(self, root, user_id):
+        self.root = root
+        self.user_id = user_id
+
+    def upload(self, path, data, file_options=None):
+        if path.split("/")[0] != self.user_id:
+            raise APIError("new row violates row-level security policy")
+        full_path = os.path.abspath(os.path.join(self.root, *path.split("/")))
+        if not full_path.startswith(os.path.abspath(self.root) + os.sep) or ".." in path.split("/"):
+            raise APIError("Invalid key")
+        if os.path.exists(full_path):
+            raise APIError("The resource already exists")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "xb") as f:
+            f.write(data)
+        return {"Key": path}
+
+
+# --- RPC functions (see the migration_*.sql files) ---
+
+def _row_bytes(row):
+    # Rough stand-in for pg_column_size
+    return sum(len(v) if isinstance(v, (str, bytes)) else 8 for v in row.values() if v is not None)
+
+
+def _compact_reset_attempts(client, target_user=None):
+    conn = client.db.conn()
+    with transaction(conn):
+        moved = [dict(r) for r in conn.execute(
+            "DELETE FROM test_attempts WHERE user_id = ? AND is_reset RETURNING *", (client.user_id,)
+        ).fetchall()]
+        archived_bytes = 0
+        events = {}
+        for a in moved:
+            archive_row = {k: a[k] for k in ("id", "test_id", "user_id", "score", "total_questions", "time_taken", "set_name", "completed_at", "reset_at")}
+            archive_row["archived_at"] = _now()
+            cur = conn.execute(
+                f"INSERT INTO test_attempts_archive ({', '.join(archive_row)}) VALUES ({', '.join('?' * len(archive_row))}) ON CONFLICT (id) DO NOTHING",
+                list(archive_row.values()),
+            )
+            if cur.rowcount:
+                archived_bytes += _row_bytes(archive_row)
+            events.setdefault((a['test_id'], a['reset_at']), []).append(a)
+
+        for (test_id, reset_at), attempts in events.items():
+            percentages = [a['score'] * 100.0 / a['total_questions'] for a in attempts if a['total_questions'] > 0]
+            conn.execute(
+                "INSERT INTO test_reset_events (id, test_id, user_id, reset_at, attempt_count, avg_score, best_score,"
+                " total_time_taken, first_completed_at, last_completed_at, compacted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(uuid.uuid4()), test_id, client.user_id, reset_at, len(attempts),
+                    round(sum(percentages) / len(percentages)) if percentages else None,
+                    round(max(percentages)) if percentages else None,
+                    sum(a['time_taken'] for a in attempts),
+                    min(a['completed_at'] for a in attempts), max(a['completed_at'] for a in attempts), _now(),
+                ),
+            )
+    return [{
+        "rows_archived": len(moved),
+        "reset_events": len(events),
+        "bytes_removed": sum(_row_bytes(a) for a in moved),
+        "bytes_archived": archived_bytes,
+    }]
+
+
+def _pick_questions(client, picks):
+    # Each test's content is parsed once, however many questions come from it
+    test_ids = list({p['test_id'] for p in picks})
+    contents = {}
+    if test_ids:
+        rows = client.db.conn().execute(
+            f"SELECT id, content FROM tests WHERE user_id = ? AND id IN ({', '.join('?' * len(test_ids))})",
+            [client.user_id] + test_ids,
+        ).fetchall()
+        contents = {r['id']: json.loads(r['content']) for r in rows}
+    out = []
+    for p in picks:
+        if p['test_id'] not in contents:
+            continue
+        try:
+            question = contents[p['test_id']]['sets'][int(p['set_index'])]['questions'][int(p['question_index'])]
+        except (KeyError, IndexError, TypeError):
+            question = None
+        out.append({"test_id": p['test_id'], "set_index": p['set_index'], "question_index": p['question_index'], "question": question})
+    return out
+
+
+# Folder and its subfolders, as in migration_trend_series.sql
+_SUBTREE = """
+WITH RECURSIVE subtree AS (
+  SELECT id FROM folders WHERE id = ? AND user_id = ?
+  UNION ALL
+  SELECT f.id FROM folders f JOIN subtree s ON f.parent_id = s.id WHERE f.user_id = ?
+)
+"""
+
+
+def _score_trend(client, folder=None, test=None, bucket="day", points=60):
+    rows = client.db.conn().execute(
+        _SUBTREE + """
+        SELECT b.day, sum(b.attempt_count) AS attempt_count, sum(b.score_sum) AS score_sum, sum(b.time_sum) AS time_sum
+        FROM test_score_buckets b
+        WHERE b.user_id = ? AND b.test_id IN (
+          SELECT id FROM tests WHERE user_id = ? AND id = ?
+          UNION
+          SELECT t.id FROM tests t JOIN subtree s ON t.folder_id = s.id WHERE t.user_id = ? AND t.assembly IS NULL
+        )
+        GROUP BY b.day""",
+        [folder, client.user_id, client.user_id] + [client.user_id] * 2 + [test, client.user_id],
+    ).fetchall()
+    return [{
+        "start_day": entry['start'].isoformat(),
+        "end_day": entry['end'].isoformat(),
+        "attempt_count": entry['attempt_count'],
+        "score_sum": entry['score_sum'],
+        "time_sum": entry['time_sum'],
+    } for entry in trends.bucket_series([dict(r) for r in rows], bucket, points)]
+
+
+def _folder_question_index(client, folder):
+    conn = client.db.conn()
+    if conn.execute("SELECT 1 FROM folders WHERE id = ? AND user_id = ?", (folder, client.user_id)).fetchone() is None:
+        return None
+    rows = conn.execute(
+        _SUBTREE + """
+        SELECT q.test_id, q.set_index, q.question_count
+        FROM question_index q JOIN tests t ON t.id = q.test_id JOIN subtree s ON t.folder_id = s.id
+        WHERE q.user_id = ? AND t.user_id = ? AND t.assembly IS NULL""",
+        (folder, client.user_id, client.user_id, client.user_id, client.user_id),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _pointer(pointer):
+    if pointer is None:
+        raise APIError("Missing path")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise APIError(f'Invalid JSON pointer "{pointer}"')
+    return [p.replace("~1", "/").replace("~0", "~") for p in pointer[1:].split("/")]
+
+
+def _resolve(doc, path):
+    for part in path:
+        if isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        elif isinstance(doc, list) and _INDEX.match(part) and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            raise APIError(f'Path "/{"/".join(path)}" does not exist')
+    return doc
+
+
+def _patch_add(doc, path, value):
+    if not path:
+        return value
+    parent = _resolve(doc, path[:-1])
+    key = path[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        if key == "-":
+            parent.append(value)
+        elif _INDEX.match(key) and int(key) <= len(parent):
+            parent.insert(int(key), value)
+        else:
+            raise APIError(f'Array index "{key}" out of range')
+    else:
+        raise APIError(f'Path "/{"/".join(path[:-1])}" does not exist')
+    return doc
+
+
+def _patch_remove(doc, path):
+    if not path:
+        raise APIError("Cannot remove the whole document")
+    value = _resolve(doc, path)
+    parent = _resolve(doc, path[:-1])
+    if isinstance(parent, dict):
+        del parent[path[-1]]
+    else:
+        del parent[int(path[-1])]
+    return value
+
+
+def apply_patch(doc, ops):
+    # RFC 6902, same behaviour as jsonb_patch() in migration_content_patch.sql
+    doc = copy.deepcopy(doc)
+    for i, op in enumerate(ops):
+        path = _pointer(op.get('path'))
+        kind = op.get('op')
+        if kind == "add":
+            doc = _patch_add(doc, path, copy.deepcopy(op.get('value')))
+        elif kind == "remove":
+            _patch_remove(doc, path)
+        elif kind == "replace":
+            _resolve(doc, path)
+            if not path:
+                doc = copy.deepcopy(op.get('value'))
+            else:
+                parent = _resolve(doc, path[:-1])
+                parent[path[-1] if isinstance(parent, dict) else int(path[-1])] = copy.deepcopy(op.get('value'))
+        elif kind == "move":
+            from_path = _pointer(op.get('from'))
+            if path[:len(from_path)] == from_path and len(path) > len(from_path):
+                raise APIError("Cannot move a value into itself")
+            doc = _patch_add(doc, path, _patch_remove(doc, from_path))
+        elif kind == "copy":
+            doc = _patch_add(doc, path, copy.deepcopy(_resolve(doc, _pointer(op.get('from')))))
+        elif kind == "test":
+            if _resolve(doc, path) != op.get('value'):
+                raise APIError(f'Test failed at "{op.get("path")}"')
+        else:
+            raise APIError(f'Unknown op "{kind}" in operation {i}')
+    return doc
+
+
+def _patch_test_content(client, target, ops):
+    conn = client.db.conn()
+    with transaction(conn):
+        row = conn.execute(
+            "SELECT content, question_count, set_count, question_range FROM tests WHERE id = ? AND user_id = ?",
+            (target, client.user_id),
+        ).fetchone()
+        if row is None:
+            raise APIError("Test not found")
+        if not isinstance(ops, list):
+            raise APIError("Patch must be an array of operations")
+        doc = apply_patch(json.loads(row['content']), ops)
+        if not isinstance(doc, dict) or not isinstance(doc.get('sets'), list):
+            raise APIError("Content must be an object with a sets array")
+
+        # Which sets to re-validate, and whether question/set counts can have changed
+        check_all = structural = False
+        touched = set()
+        for op in ops:
+            if op.get('op') == "test":
+                continue
+            for pointer in (op.get('path'), op.get('from')):
+                if pointer is None:
+                    continue
+                p = _pointer(pointer)
+                if not p or (p[0] == "sets" and len(p) <= 2):
+                    check_all = structural = True
+                elif p[0] == "sets":
+                    if p[1].isdigit():
+                        touched.add(int(p[1]))
+                    else:
+                        check_all = True
+                    if len(p) <= 4 and p[2] == "questions":
+                        structural = True
+
+        for i, s in enumerate(doc['sets']):
+            if check_all or i in touched:
+                try:
+                    msgspec.convert(s, QuestionSet)
+                except msgspec.ValidationError as e:
+                    raise APIError(f"sets[{i}]: {e}") from None
+
+        stats = {"question_count": row['question_count'], "set_count": row['set_count'], "question_range": row['question_range']}
+        if structural:
+            stats = question_stats([len(s['questions']) for s in doc['sets']])
+        conn.execute(
+            "UPDATE tests SET content = ?, question_count = ?, set_count = ?, question_range = ?, content_hash = NULL WHERE id = ? AND user_id = ?",
+            (json.dumps(doc), stats['question_count'], stats['set_count'], stats['question_range'], target, client.user_id),
+        )
+    return [stats]
+
+
+_RPCS = {
+    "compact_reset_attempts": _compact_reset_attempts,
+    "pick_questions": _pick_questions,
+    "patch_test_content": _patch_test_content,
+    "score_trend": _score_trend,
+    "folder_question_index": _folder_question_index,
+}
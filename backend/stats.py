@@ -0,0 +1,23 @@
+# Per-test score stats over a user's live (non-reset) attempts, shared by
+# get_folders and get_tests. Values are unrounded percentages; callers round.
+
+def compute_test_stats(attempts):
+    by_test = {}
+    for a in attempts:
+        if a.get('is_reset', False):
+            continue
+        if a['total_questions'] > 0:
+            percentage = (a['score'] / a['total_questions']) * 100
+        else:
+            percentage = 0
+        by_test.setdefault(a['test_id'], []).append(percentage)
+
+    test_stats = {}
+    for test_id, percentages in by_test.items():
+        test_stats[test_id] = {
+            "attempt_count": len(percentages),
+            "avg_score": sum(percentages) / len(percentages),
+            "best_score": max(percentages),
+            "last_score": percentages[0],
+        }
+    return test_stats
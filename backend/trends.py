@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+# Score/time trends built from the per-day rollups in test_score_buckets
+# (maintained by triggers on test_attempts, see migration_trends.sql).
+# Each rollup row: day, attempt_count, score_sum (sum of percentages), time_sum.
+# The score_trend database function merges and downsamples them; build_series
+# adds the averages and rolling averages.
+
+BUCKETS = ("day", "week")
+
+
+def _bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _bucket_end(start, bucket):
+    if bucket == "week":
+        return start + timedelta(days=6)
+    return start
+
+
+def _avg(total, count):
+    return round(total / count, 1) if count else None
+
+
+def bucket_series(rows, bucket="day", points=60):
+    # Merge rollups (possibly from many tests) into one series per bucket; same
+    # result as the score_trend function in migration_trend_series.sql
+    merged = {}
+    for row in rows:
+        day = row['day'] if isinstance(row['day'], date) else date.fromisoformat(row['day'][:10])
+        start = _bucket_start(day, bucket)
+        if start not in merged:
+            merged[start] = {"start": start, "end": _bucket_end(start, bucket), "attempt_count": 0, "score_sum": 0.0, "time_sum": 0}
+        entry = merged[start]
+        entry['attempt_count'] += row['attempt_count']
+        entry['score_sum'] += float(row['score_sum'])
+        entry['time_sum'] += row['time_sum']
+    series = [merged[k] for k in sorted(merged)]
+
+    # Downsample into at most `points` contiguous groups so the payload size is fixed
+    if len(series) > points:
+        groups = []
+        for i in range(points):
+            chunk = series[i * len(series) // points:(i + 1) * len(series) // points]
+            groups.append({
+                "start": chunk[0]['start'],
+                "end": chunk[-1]['end'],
+                "attempt_count": sum(c['attempt_count'] for c in chunk),
+                "score_sum": sum(c['score_sum'] for c in chunk),
+                "time_sum": sum(c['time_sum'] for c in chunk),
+            })
+        series = groups
+    return series
+
+
+def build_series(rows, bucket="day", window=7):
+    # rows: score_trend results (start_day, end_day, attempt_count, score_sum, time_sum)
+    series = [{
+        "start": r['start_day'] if isinstance(r['start_day'], date) else date.fromisoformat(r['start_day'][:10]),
+        "end": r['end_day'] if isinstance(r['end_day'], date) else date.fromisoformat(r['end_day'][:10]),
+        "attempt_count": r['attempt_count'],
+        "score_sum": float(r['score_sum']),
+        "time_sum": r['time_sum'],
+    } for r in rows]
+
+    result = []
+    for i, entry in enumerate(series):
+        recent = series[max(0, i - window + 1):i + 1]
+        recent_count = sum(r['attempt_count'] for r in recent)
+        result.append({
+            "start": entry['start'].isoformat(),
+            "end": entry['end'].isoformat(),
+            "attempt_count": entry['attempt_count'],
+            "avg_score": _avg(entry['score_sum'], entry['attempt_count']),
+            "avg_time_taken": _avg(entry['time_sum'], entry['attempt_count']),
+            "rolling_avg_score": _avg(sum(r['score_sum'] for r in recent), recent_count),
+            "rolling_avg_time_taken": _avg(sum(r['time_sum'] for r in recent), recent_count),
+        })
+
+    total_count = sum(e['attempt_count'] for e in series)
+    return {
+        "bucket": bucket,
+        "attempt_count": total_count,
+        "avg_score": _avg(sum(e['score_sum'] for e in series), total_count),
+        "avg_time_taken": _avg(sum(e['time_sum'] for e in series), total_count),
+        "points": result,
+    }
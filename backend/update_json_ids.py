@@ -1,36 +1,39 @@
 import os
+import sys
 import json
-import uuid
 
-JSON_DIR = r"d:\Abeeshan\github\test-taker\json"
+from ingest import stamp_id
 
-def update_json_files():
-    print(f"Scanning directory: {JSON_DIR}")
-    if not os.path.exists(JSON_DIR):
+# Adds a missing "id" to every question bank in a directory (recursively).
+# ingest.py does the same while uploading; this only touches the files.
+#
+#   python update_json_ids.py [directory]   # default: the repo's json/ directory
+
+JSON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "json")
+
+def update_json_files(json_dir=JSON_DIR):
+    print(f"Scanning directory: {json_dir}")
+    if not os.path.exists(json_dir):
         print("Directory not found!")
         return
 
-    for filename in os.listdir(JSON_DIR):
-        if filename.endswith(".json"):
-            filepath = os.path.join(JSON_DIR, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                if 'id' not in data:
-                    new_id = str(uuid.uuid4())
-                    print(f"Adding ID {new_id} to {filename}")
-                    # Insert ID at the beginning
-                    new_data = {"id": new_id}
-                    new_data.update(data)
-                    
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        json.dump(new_data, f, indent=2)
-                else:
-                    print(f"Skipping {filename} (already has ID: {data['id']})")
+    for dirpath, dirnames, filenames in os.walk(json_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if filename.endswith(".json") and not filename.startswith("."):
+                filepath = os.path.join(dirpath, filename)
+                try:
+                    with open(filepath, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
                     
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
+                    if 'id' not in data:
+                        new_data = stamp_id(filepath, data)
+                        print(f"Adding ID {new_data['id']} to {filename}")
+                    else:
+                        print(f"Skipping {filename} (already has ID: {data['id']})")
+                        
+                except Exception as e:
+                    print(f"Error processing {filename}: {e}")
 
 if __name__ == "__main__":
-    update_json_files()
+    update_json_files(sys.argv[1] if len(sys.argv) > 1 else JSON_DIR)
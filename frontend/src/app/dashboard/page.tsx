@@ -106,8 +106,9 @@ export default function Dashboard() {
       }
     });
 
+    // Assembled practice tests don't count towards folders (same as GET /folders)
     tests.forEach(t => {
-      if (t.folder_id && testsMap.has(t.folder_id)) {
+      if (t.folder_id && testsMap.has(t.folder_id) && !t.is_assembled) {
         testsMap.get(t.folder_id)!.push(t.id);
       }
     });
@@ -120,7 +120,7 @@ export default function TestStatsModal({ isOpen, onClose, initialTestId, refresh
       if (!session) return;
 
       const [attemptsRes, testsRes] = await Promise.all([
-        fetch(`${API_URL}/attempts`, {
+        fetch(`${API_URL}/attempts?include_archived=true`, {
           headers: {
             'Authorization': `Bearer ${session.access_token}`
           }
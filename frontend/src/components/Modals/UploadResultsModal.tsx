@@ -6,6 +6,7 @@ interface UploadResult {
   filename: string;
   status: 'success' | 'created' | 'updated' | 'error';
   detail?: string;
+  errors?: { path: string | null; set: number | null; question: number | null; detail: string }[];
   id?: string;
 }
 
@@ -59,6 +60,19 @@ export default function UploadResultsModal({ isOpen, onClose, results }: UploadR
                 {result.detail && (
                   <div className="text-xs text-red-500 mt-0.5">{result.detail}</div>
                 )}
+                {result.errors && result.errors.length > 0 && (
+                  <ul className="text-xs text-red-500 mt-0.5 list-disc list-inside">
+                    {result.errors.slice(0, 5).map((error, i) => (
+                      <li key={i}>
+                        {error.set !== null && `Set ${error.set + 1}`}
+                        {error.question !== null && `, Q${error.question + 1}`}
+                        {error.set !== null && ': '}
+                        {error.detail}
+                      </li>
+                    ))}
+                    {result.errors.length > 5 && <li>{result.errors.length - 5} more...</li>}
+                  </ul>
+                )}
               </div>
               <div className="ml-3 flex-shrink-0">
                 {result.status === 'created' || result.status === 'success' ? (
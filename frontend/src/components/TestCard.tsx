@@ -63,8 +63,16 @@ function TestCard({ test, onStart, onDelete, onRename, onReset, onToggleStar, on
         </h3>
 
         <div className="space-y-1 text-sm text-gray-500 dark:text-slate-300">
-          <div>
+          <div className="flex items-center gap-2">
             <span>{test.attempt_count} attempt(s)</span>
+            {test.is_assembled && (
+              <span
+                className="px-1.5 py-0.5 text-[10px] uppercase tracking-wider font-semibold rounded bg-amber-50 dark:bg-amber-900/30 text-amber-700 dark:text-amber-400 border border-amber-200 dark:border-amber-800"
+                title="Randomized practice test; not counted in folder stats"
+              >
+                Practice
+              </span>
+            )}
           </div>
 
           <div>
@@ -36,6 +36,7 @@ export interface Test {
   last_score?: number | null;
   question_range?: string | null;
   sets?: { title: string }[];
+  is_assembled?: boolean; // Practice test from POST /folders/{id}/assemble
 }
 
 export interface Folder {